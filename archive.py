@@ -0,0 +1,196 @@
+import fnmatch
+import glob
+import io
+import os
+import struct
+import tarfile
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+# Size of the blocks compressed in parallel, and of the dictionary shared between blocks
+BLOCK_SIZE = 128 * 1024
+DICTIONARY_SIZE = 32 * 1024
+
+
+def normalize_member_name(name):
+    # Botpress exports store their members as "./content-elements/...",
+    # we always refer to them without the leading "./"
+    while name.startswith("./"):
+        name = name[2:]
+    return name
+
+
+def find_bots(bot_path):
+    """Returns the sorted list of the bot archives matching a path, a glob pattern or a directory"""
+    if os.path.isdir(bot_path):
+        bot_path = os.path.join(bot_path, "*.tgz")
+    return sorted(path for path in glob.glob(bot_path) if os.path.isfile(path))
+
+
+def read_members(bot_path, names):
+    """Read some files from a bot archive without extracting it.
+
+    The archive is read as a gzip stream and only the requested members are
+    loaded in memory. The result is a dictionary with the member name as key
+    and the content of the member (bytes) as value. Members that are not in
+    the archive are not in the dictionary. The names can be glob patterns.
+    """
+    with metrics.timer("read archive"):
+        return dict(iter_members(bot_path, names))
+
+
+def iter_members(bot_path, names):
+    """Yields the (name, content) of the requested members of a bot archive, in the order of the archive.
+
+    The members are yielded as soon as they are read, so they can be processed
+    while the rest of the archive is decompressed. See read_members.
+    """
+    wanted = set(name for name in names if not is_pattern(name))
+    patterns = [name for name in names if is_pattern(name)]
+    found = 0
+    with tarfile.open(bot_path, "r|gz") as tar:
+        for member in tar:
+            name = normalize_member_name(member.name)
+            if not member.isfile():
+                continue
+            if name in wanted:
+                found += 1
+            elif not any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+                continue
+            content = tar.extractfile(member).read()
+            metrics.count("bytes read", member.size)
+            yield name, content
+            # Stop reading the stream once everything has been found
+            if not patterns and found == len(wanted):
+                break
+
+
+def is_pattern(name):
+    return any(character in name for character in "*?[")
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """Write-only file compressing its content to a gzip file using several threads.
+
+    The content is split in blocks compressed independently, each block using
+    the end of the previous one as dictionary, and the compressed blocks are
+    concatenated in a single deflate stream. This is how pigz works, the
+    result is a standard gzip file.
+    """
+
+    def __init__(self, path, compression_level=9, threads=4):
+        self.file = open(path, "wb")
+        self.compression_level = compression_level
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        # Compressed blocks waiting to be written, in order
+        self.pending = []
+        self.max_pending = threads * 2
+        self.buffer = bytearray()
+        self.dictionary = b""
+        self.crc = 0
+        self.size = 0
+        # gzip header: magic number, deflate, no flags, modification time, no extra flags, unix
+        self.file.write(b"\x1f\x8b\x08\x00" + struct.pack("<I", int(time.time())) + b"\x00\x03")
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self.buffer += data
+        while len(self.buffer) >= BLOCK_SIZE:
+            self.submit(bytes(self.buffer[:BLOCK_SIZE]), last=False)
+            del self.buffer[:BLOCK_SIZE]
+        return len(data)
+
+    def submit(self, block, last):
+        self.pending.append(
+            self.executor.submit(compress_block, block, self.dictionary, self.compression_level, last)
+        )
+        self.dictionary = block[-DICTIONARY_SIZE:]
+        # Keep the memory usage bounded
+        while len(self.pending) > self.max_pending:
+            self.file.write(self.pending.pop(0).result())
+
+    def close(self):
+        if self.closed:
+            return
+        self.submit(bytes(self.buffer), last=True)
+        for future in self.pending:
+            self.file.write(future.result())
+        self.executor.shutdown()
+        # gzip trailer: CRC32 and size of the uncompressed content
+        self.file.write(struct.pack("<II", self.crc, self.size & 0xFFFFFFFF))
+        self.file.close()
+        super().close()
+
+    def abort(self):
+        """Stops the compression and closes the file without finishing it"""
+        if self.closed:
+            return
+        self.executor.shutdown(cancel_futures=True)
+        self.file.close()
+        super().close()
+
+
+def compress_block(block, dictionary, compression_level, last):
+    if dictionary:
+        compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    # A sync flush ends the block on a byte boundary, so the blocks can be concatenated
+    return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def write_archive(bot_path, new_path, replacements, compression_level=9, compression_threads=1):
+    """Write a copy of a bot archive where some files have a new content.
+
+    replacements is a dictionary with the member name as key and the new
+    content (bytes) as value. Every other member is copied from the stream of
+    the original archive unchanged, nothing is written to a temporary directory.
+    With several compression threads, the archive is compressed in parallel.
+    The archive is written to a temporary file next to new_path, that replaces
+    new_path once complete: new_path can be bot_path, and when the archive
+    can't be written, no partial archive is left.
+    """
+    temporary_path = "%s.%s.tmp" % (new_path, uuid.uuid4().hex[:8])
+    compressed_file = None
+    target = None
+    try:
+        if compression_threads > 1:
+            compressed_file = ParallelGzipWriter(temporary_path, compression_level, compression_threads)
+            target = tarfile.open(fileobj=compressed_file, mode="w|")
+        else:
+            target = tarfile.open(temporary_path, "w:gz", compresslevel=compression_level)
+
+        with metrics.timer("write archive"), tarfile.open(bot_path, "r|gz") as source:
+            with target:
+                for member in source:
+                    name = normalize_member_name(member.name)
+                    if member.isfile() and name in replacements:
+                        content = replacements[name]
+                        member.size = len(content)
+                        target.addfile(member, io.BytesIO(content))
+                    elif member.isfile():
+                        target.addfile(member, source.extractfile(member))
+                    else:
+                        target.addfile(member)
+                    metrics.count("bytes written", member.size)
+            # The tar file doesn't close the file objects it didn't open
+            if compressed_file:
+                compressed_file.close()
+        os.replace(temporary_path, new_path)
+    except BaseException:
+        # A truncated archive would look like a valid gzip file
+        if target and not target.closed:
+            target.fileobj.close()
+        if compressed_file:
+            compressed_file.abort()
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
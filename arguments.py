@@ -0,0 +1,24 @@
+# Parsing of the values of the command line arguments and of the jobs of the service
+
+import argparse
+
+TRUE_VALUES = ("y", "yes", "t", "true", "on", "1")
+FALSE_VALUES = ("n", "no", "f", "false", "off", "0")
+
+
+def parse_bool(value):
+    """Parses a boolean flag value like true, false, yes, no, 1 or 0"""
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in TRUE_VALUES:
+        return True
+    if str(value).lower() in FALSE_VALUES:
+        return False
+    raise argparse.ArgumentTypeError("Invalid boolean value " + repr(value))
+
+
+def split_list(value):
+    """Splits a list of values separated by commas"""
+    if isinstance(value, list):
+        return value
+    return [item.strip() for item in value.split(",") if item.strip()]
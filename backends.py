@@ -0,0 +1,210 @@
+import re
+import threading
+
+from dispatcher import (
+    DEFAULT_CHARACTERS_PER_SECOND,
+    MAX_BYTES_PER_REQUEST,
+    MAX_CHARACTERS_PER_REQUEST,
+    MAX_TEXTS_PER_REQUEST,
+)
+
+# The texts too long for a model are cut at the ends of the sentences, then between the words.
+# The spaces inside the placeholder tokens (<x id="0"/>) are not cut.
+SENTENCE_SEPARATOR = re.compile(r"((?<=[.!?:;])\s+|\n+)(?![^<>]*>)")
+WORD_SEPARATOR = re.compile(r"(\s+)(?![^<>]*>)")
+
+
+class TranslationBackend:
+    """Base class of the translation backends.
+
+    A backend translates batches of texts. The class attributes describe how
+    the texts must be batched and sent, and how much the translations cost.
+    """
+
+    name = "Translation backend"
+    # Limits of a single batch
+    max_texts_per_request = MAX_TEXTS_PER_REQUEST
+    max_characters_per_request = MAX_CHARACTERS_PER_REQUEST
+    max_bytes_per_request = MAX_BYTES_PER_REQUEST
+    # Maximum number of batches translated at the same time, None for no limit
+    max_concurrency = None
+    # Maximum number of characters per second, None for no limit
+    characters_per_second = None
+    # Price in dollars per million characters
+    cost_per_million_characters = 0
+    # Whether the translations are worth saving in the translation memory
+    use_memory = False
+
+    def translate_batch(self, texts, source, target):
+        """Returns the list of the translations of the texts, in the same order"""
+        raise NotImplementedError()
+
+    def estimate_cost(self, texts):
+        """Returns the price in dollars of the translation of the texts"""
+        characters = sum(len(text) for text in texts)
+        return characters * self.cost_per_million_characters / 1000000
+
+
+class GoogleBackend(TranslationBackend):
+    """Google Cloud Translation API (basic edition)"""
+
+    name = "Google Translate"
+    characters_per_second = DEFAULT_CHARACTERS_PER_SECOND
+    # See https://cloud.google.com/translate/pricing
+    cost_per_million_characters = 20
+    use_memory = True
+
+    def __init__(self, client=None):
+        # client defaults to the Google Translate client, any object with the
+        # same translate method can be used instead
+        self.client = client
+
+    def translate_batch(self, texts, source, target):
+        from html import unescape
+
+        client = self.client or get_google_client()
+        results = client.translate(texts, target_language=target, source_language=source)
+        # Results is a list of dictionaries, with input and translatedText
+        return [unescape(result["translatedText"]) for result in results]
+
+
+# The Google Translate client is created once and reused between calls
+google_client = None
+
+
+def get_google_client():
+    global google_client
+    if google_client is None:
+        from google.cloud import translate_v2 as translate
+        google_client = translate.Client()
+    return google_client
+
+
+class MarianBackend(TranslationBackend):
+    """Offline translation with the MarianMT models of Helsinki-NLP, on the CPU.
+
+    Requires the transformers, sentencepiece and torch packages. The model
+    of each language pair is downloaded on first use, and the texts are
+    translated in batches of batch_size texts.
+    """
+
+    name = "MarianMT"
+    max_texts_per_request = 32
+    # The model uses all the CPU cores, translating several batches at a time doesn't help
+    max_concurrency = 1
+
+    def __init__(self, batch_size=32):
+        self.max_texts_per_request = batch_size
+        self.models = dict()
+        self.lock = threading.Lock()
+
+    def get_model(self, source, target):
+        with self.lock:
+            if (source, target) not in self.models:
+                from transformers import MarianMTModel, MarianTokenizer
+
+                model_name = "Helsinki-NLP/opus-mt-%s-%s" % (source, target)
+                print("Loading translation model " + model_name)
+                self.models[(source, target)] = (
+                    MarianTokenizer.from_pretrained(model_name),
+                    MarianMTModel.from_pretrained(model_name),
+                )
+            return self.models[(source, target)]
+
+    def translate_batch(self, texts, source, target):
+        tokenizer, model = self.get_model(source, target)
+        max_length = tokenizer.model_max_length
+
+        def fits(text):
+            # A token has at least one character, the short texts always fit
+            return len(text) < max_length or len(tokenizer(text).input_ids) <= max_length
+
+        # The model would truncate the long texts, they are translated in pieces
+        splits = [split_text(text, fits) for text in texts]
+        pieces = [piece for parts in splits for piece in parts[::2] if piece.strip()]
+        translated = dict()
+        for start in range(0, len(pieces), self.max_texts_per_request):
+            batch = pieces[start : start + self.max_texts_per_request]
+            translated.update(zip(batch, self.generate(tokenizer, model, batch)))
+
+        translations = []
+        for parts in splits:
+            # The separators between the pieces are kept as they are
+            translations.append(
+                "".join(translated.get(part, part) if index % 2 == 0 else part for index, part in enumerate(parts))
+            )
+        return translations
+
+    def generate(self, tokenizer, model, texts):
+        import torch
+
+        # The pieces fit in the model, truncation only cuts a single word longer than the model
+        inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+        with torch.no_grad():
+            outputs = model.generate(**inputs)
+        return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+def split_text(text, fits, separators=(SENTENCE_SEPARATOR, WORD_SEPARATOR)):
+    """Splits a text in pieces for which fits returns True, at the first separators possible.
+
+    Returns the list of the pieces and of the separators between them
+    ([piece, separator, piece...]), joining the list gives back the text.
+    """
+    if fits(text) or not separators:
+        return [text]
+    parts = separators[0].split(text)
+    result = []
+    current = parts[0]
+    for index in range(1, len(parts), 2):
+        separator, part = parts[index], parts[index + 1]
+        if fits(current + separator + part):
+            current += separator + part
+        else:
+            result += split_text(current, fits, separators[1:]) + [separator]
+            current = part
+    return result + split_text(current, fits, separators[1:])
+
+
+class FakeBackend(TranslationBackend):
+    """Deterministic backend for tests and benchmarks, the translation is the text prefixed by the language"""
+
+    name = "Fake translator"
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def translate_batch(self, texts, source, target):
+        with self.lock:
+            self.calls += 1
+        return ["[" + target + "] " + text for text in texts]
+
+
+class CopyBackend(TranslationBackend):
+    """Doesn't translate, the translation is a copy of the text"""
+
+    name = "copies of the original texts"
+    max_texts_per_request = float("inf")
+    max_characters_per_request = float("inf")
+    max_bytes_per_request = float("inf")
+
+    def translate_batch(self, texts, source, target):
+        return list(texts)
+
+
+BACKENDS = {
+    "google": GoogleBackend,
+    "marian": MarianBackend,
+    "fake": FakeBackend,
+    "copy": CopyBackend,
+}
+
+
+def get_backend(backend):
+    """Returns a backend from its name, backend objects are returned as they are"""
+    if isinstance(backend, TranslationBackend):
+        return backend
+    if backend not in BACKENDS:
+        raise Exception("Unknown translation backend " + str(backend))
+    return BACKENDS[backend]()
@@ -0,0 +1,229 @@
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from extract import (
+    DEFAULT_FUZZY_THRESHOLD,
+    build_records,
+    carry_over_unchanged,
+    elements_entries,
+    find_fuzzy_matches,
+    find_texts_to_translate,
+    journal_options,
+    load_previous_translations,
+    merge_translations,
+    previous_english_texts,
+    read_elements,
+    translate_texts,
+)
+from formats import write_translations
+from journal import Journal, journal_path
+from manifest import element_hashes, manifest_path, write_manifest
+from pack import pack
+
+
+def bot_name(bot_path):
+    name = os.path.basename(bot_path)
+    for extension in (".tgz", ".tar.gz"):
+        if name.endswith(extension):
+            return name[: -len(extension)]
+    return os.path.splitext(name)[0]
+
+
+def bot_file_path(path, bot_path):
+    # translations.xlsx becomes <bot>_translations.xlsx, unless the path contains a {bot} placeholder
+    if not path:
+        return path
+    if "{bot}" in path:
+        return path.replace("{bot}", bot_name(bot_path))
+    directory, name = os.path.split(path)
+    return os.path.join(directory, bot_name(bot_path) + "_" + name)
+
+
+def bot_file_paths(paths, bot_path):
+    # Several translation files can be given as a list
+    if isinstance(paths, list):
+        return [bot_file_path(path, bot_path) for path in paths]
+    return bot_file_path(paths, bot_path)
+
+
+def print_summary(results):
+    print("Summary:")
+    for bot_path, error in results.items():
+        if error is None:
+            print("  ✅ " + bot_path)
+        else:
+            print("  ❌ " + bot_path + ": " + error)
+    failed = len([error for error in results.values() if error is not None])
+    print(f"{len(results) - failed} succeeded, {failed} failed")
+
+
+def format_error(error):
+    return "".join(traceback.format_exception_only(type(error), error)).strip()
+
+
+def batch_extract(
+    bot_paths,
+    excel_path,
+    source,
+    targets,
+    use_google_translate,
+    previous,
+    memory=None,
+    max_workers=4,
+    characters_per_second=None,
+    processes=None,
+    format="auto",
+    backend="google",
+    mask_placeholders=True,
+    fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD,
+    resume=False,
+):
+    """Extracts the translations of several bots.
+
+    The bots are read and their translation files written in a process pool,
+    and the texts are translated once for all the bots. excel_path and previous
+    are paths for each bot, see bot_file_path. Returns a dictionary with
+    the bot path as key and None or the error message as value.
+    The translations shared by the bots are saved to a single journal, see journal.py.
+    """
+    if isinstance(targets, str):
+        targets = [targets]
+    if not use_google_translate:
+        backend = "copy"
+    results = dict()
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        print(f"Loading texts from {len(bot_paths)} bots")
+        futures = {bot_path: executor.submit(read_elements, bot_path) for bot_path in bot_paths}
+        bots = dict()
+        for bot_path, future in futures.items():
+            try:
+                elements = future.result()
+                bot_previous = bot_file_path(previous, bot_path)
+                translations = load_previous_translations(bot_previous, targets)
+                hashes = element_hashes(elements)
+                carried_over = carry_over_unchanged(elements, hashes, bot_previous, translations)
+                bots[bot_path] = (elements_entries(elements), translations, hashes, carried_over)
+            except Exception as error:
+                results[bot_path] = format_error(error)
+
+        # Remove the texts already translated for each bot, or similar to the previous translations
+        # of the bot, and the duplicates between bots
+        texts_to_translate = {target: dict() for target in targets}
+        fuzzy_matches = dict()
+        for bot_path, (entries, translations, _, carried_over) in bots.items():
+            english_translations = previous_english_texts(translations)
+            bot_texts = find_texts_to_translate(entries, targets, carried_over, english_translations)
+            fuzzy_matches[bot_path] = find_fuzzy_matches(bot_texts, translations, fuzzy_threshold)
+            for target in targets:
+                for text in bot_texts[target]:
+                    if text not in fuzzy_matches[bot_path][target]:
+                        texts_to_translate[target][text] = None
+
+        journal = Journal(
+            journal_path(bot_file_path(excel_path, "batch")),
+            resume,
+            journal_options(backend, mask_placeholders),
+        )
+        try:
+            translated_texts = translate_texts(
+                {target: list(texts) for target, texts in texts_to_translate.items()},
+                source,
+                backend,
+                memory=memory,
+                max_workers=max_workers,
+                characters_per_second=characters_per_second,
+                mask_placeholders=mask_placeholders,
+                journal=journal,
+            )
+        finally:
+            journal.close()
+
+        futures = dict()
+        for bot_path, (entries, translations, hashes, carried_over) in bots.items():
+            all_translated_texts = merge_translations(
+                {
+                    target: {
+                        text: translated_texts[target][text]
+                        for _, text in entries
+                        if text in translated_texts[target]
+                    }
+                    for target in targets
+                },
+                translations,
+            )
+            records = build_records(
+                entries,
+                targets,
+                all_translated_texts,
+                previous_english_texts(translations) if previous else None,
+                carried_over,
+                fuzzy_matches[bot_path],
+            )
+            futures[bot_path] = executor.submit(
+                write_translations,
+                bot_file_path(excel_path, bot_path),
+                list(records),
+                source,
+                targets,
+                format,
+            )
+        for bot_path, future in futures.items():
+            try:
+                future.result()
+                write_manifest(manifest_path(bot_file_path(excel_path, bot_path)), bots[bot_path][2])
+                results[bot_path] = None
+            except Exception as error:
+                results[bot_path] = format_error(error)
+        # The journal is kept until every translation file is written
+        if all(results[bot_path] is None for bot_path in bots):
+            journal.remove()
+
+    # Keep the order of the bots in the summary
+    return {bot_path: results[bot_path] for bot_path in bot_paths}
+
+
+def batch_pack(
+    bot_paths,
+    excel_path,
+    new_path,
+    targets=None,
+    processes=None,
+    format="auto",
+    compression_level=9,
+    compression_threads=1,
+    dry_run=False,
+    json_style="compat",
+    multilingual=False,
+):
+    """Packs several bots in a process pool.
+
+    excel_path and new_path are paths for each bot, see bot_file_path.
+    Returns a dictionary with the bot path as key and None or the error message as value.
+    """
+    results = dict()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            bot_path: executor.submit(
+                pack,
+                bot_path,
+                bot_file_paths(excel_path, bot_path),
+                bot_file_path(new_path, bot_path),
+                targets,
+                format,
+                compression_level,
+                compression_threads,
+                dry_run,
+                json_style,
+                multilingual,
+            )
+            for bot_path in bot_paths
+        }
+        for bot_path, future in futures.items():
+            try:
+                future.result()
+                results[bot_path] = None
+            except Exception as error:
+                results[bot_path] = format_error(error)
+    return results
@@ -0,0 +1,295 @@
+# Benchmarks of the extraction and the packing of botpress chatbots
+#
+# Generates synthetic chatbot exports with the six content element files, of
+# configurable sizes and with an optional large media file, and times the
+# extraction, the packing and the Excel load and save paths with a fake
+# translator. The results are saved to a JSON file, and compared to the
+# results of a previous run to catch performance regressions.
+#
+# Example:
+#   python benchmark.py --sizes 300,3000,30000,300000 --media 100 --output results.json
+#   python benchmark.py --baseline results.json
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import tarfile
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from backends import FakeBackend
+from extract import extract
+from formats import Record, load_translations, write_translations
+from metrics import metrics
+from pack import pack
+
+WORDS = (
+    "hello welcome to the chatbot please select an option below what would you like "
+    "to do next thank you for your answer click here for more information about our "
+    "services opening hours contact us order status delivery payment account help"
+).split()
+
+# Share of the texts that are copies of another text, as in real chatbots
+DUPLICATE_RATIO = 0.2
+
+
+def random_text(rng, texts):
+    if texts and rng.random() < DUPLICATE_RATIO:
+        return rng.choice(texts)
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 20))).capitalize()
+    if rng.random() < 0.1:
+        text += " {{event.payload.name}}"
+    texts.append(text)
+    return text
+
+
+# Generators of a content element for each content element file, returning
+# the element and its number of texts
+def text_element(rng, texts):
+    return {"text$en": random_text(rng, texts)}, 1
+
+
+def card_element(rng, texts):
+    actions = [
+        {"title": random_text(rng, texts), "text": random_text(rng, texts)},
+        {"title": random_text(rng, texts)},
+    ]
+    return {
+        "title$en": random_text(rng, texts),
+        "subtitle$en": random_text(rng, texts),
+        "actions$en": actions,
+    }, 5
+
+
+def carousel_element(rng, texts):
+    items = [
+        {
+            "title": random_text(rng, texts),
+            "actions": [{"title": random_text(rng, texts)} for _ in range(2)],
+        }
+        for _ in range(2)
+    ]
+    return {"items$en": items}, 6
+
+
+def image_element(rng, texts):
+    return {"title$en": random_text(rng, texts), "image": "media/picture.png"}, 1
+
+
+def single_choice_element(rng, texts):
+    choices = [{"title": random_text(rng, texts), "value": str(i)} for i in range(3)]
+    return {
+        "dropdownPlaceholder$en": random_text(rng, texts),
+        "text$en": random_text(rng, texts),
+        "choices$en": choices,
+    }, 5
+
+
+def dropdown_element(rng, texts):
+    options = [{"label": random_text(rng, texts), "value": str(i)} for i in range(3)]
+    return {
+        "message$en": random_text(rng, texts),
+        "placeholderText$en": random_text(rng, texts),
+        "options$en": options,
+    }, 5
+
+
+GENERATORS = {
+    "content-elements/builtin_text.json": text_element,
+    "content-elements/builtin_card.json": card_element,
+    "content-elements/builtin_carousel.json": carousel_element,
+    "content-elements/builtin_image.json": image_element,
+    "content-elements/builtin_single-choice.json": single_choice_element,
+    "content-elements/dropdown.json": dropdown_element,
+}
+
+
+def add_file(archive, name, data):
+    info = tarfile.TarInfo("./" + name)
+    info.size = len(data)
+    info.mtime = 0
+    archive.addfile(info, io.BytesIO(data))
+
+
+def generate_bot(path, strings, media_size=0, seed=0):
+    """Writes a synthetic chatbot export with about strings texts to path.
+
+    The texts are spread over the six content element files. media_size is
+    the size in bytes of an incompressible media file added to the archive.
+    """
+    rng = random.Random(seed)
+    texts = []
+    elements = {name: [] for name in GENERATORS}
+    count = 0
+    while count < strings:
+        for name, generator in GENERATORS.items():
+            form_data, element_strings = generator(rng, texts)
+            identifier = "%s-%d" % (name[len("content-elements/") : -len(".json")], len(elements[name]))
+            elements[name].append({"id": identifier, "formData": form_data})
+            count += element_strings
+
+    with tarfile.open(path, "w:gz", compresslevel=1) as archive:
+        config = {"id": "benchmark", "languages": ["en"], "defaultLanguage": "en"}
+        add_file(archive, "bot.config.json", json.dumps(config, indent=2).encode("utf-8"))
+        for name, content in elements.items():
+            add_file(archive, name, json.dumps(content, indent=2, ensure_ascii=False).encode("utf-8"))
+        if media_size:
+            add_file(archive, "media/video.mp4", rng.randbytes(media_size))
+    return count
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run(strings, directory, targets, media_size=0, compression_level=9):
+    """Benchmarks a chatbot of strings texts, returns the durations of the stages in seconds"""
+    bot_path = os.path.join(directory, "bot_%d.tgz" % strings)
+    excel_path = os.path.join(directory, "translations_%d.xlsx" % strings)
+    new_path = os.path.join(directory, "new_%d_{lang}.tgz" % strings)
+    copy_path = os.path.join(directory, "copy_%d.xlsx" % strings)
+
+    results = {}
+    start = time.perf_counter()
+    results["strings"] = generate_bot(bot_path, strings, media_size)
+    results["generate"] = time.perf_counter() - start
+
+    metrics.reset()
+    results["extract"] = timed(
+        extract,
+        bot_path,
+        excel_path,
+        "en",
+        targets,
+        True,
+        "",
+        backend=FakeBackend(),
+    )
+    results["extract stages"] = metrics.report()
+
+    # The Excel paths on their own: loading the translations and saving them again
+    all_translations = {}
+    results["load excel"] = timed(
+        lambda: all_translations.update(load_translations(excel_path, targets))
+    )
+    records = [
+        Record(
+            identifier,
+            original,
+            {target: all_translations[target][identifier][1] for target in targets},
+            set(),
+        )
+        for identifier, (original, _) in all_translations[targets[0]].items()
+    ]
+    results["save excel"] = timed(write_translations, copy_path, records, "en", targets)
+
+    metrics.reset()
+    results["pack"] = timed(
+        pack,
+        bot_path,
+        excel_path,
+        new_path,
+        targets,
+        compression_level=compression_level,
+    )
+    results["pack stages"] = metrics.report()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns the list of the stages slower than in the baseline by more than tolerance"""
+    regressions = []
+    for size, stages in results["sizes"].items():
+        for stage, seconds in stages.items():
+            previous = baseline["sizes"].get(size, {}).get(stage)
+            if not isinstance(seconds, float) or not previous:
+                continue
+            if seconds > previous * (1 + tolerance):
+                regressions.append((size, stage, previous, seconds))
+    return regressions
+
+
+args = argparse.ArgumentParser()
+args.add_argument(
+    "--sizes",
+    help="Numbers of texts of the benchmarked chatbots, separated by commas",
+    default="300,3000,30000",
+)
+args.add_argument(
+    "--media",
+    help="Size in MB of a media file added to the chatbots",
+    type=float,
+    default=0,
+)
+args.add_argument(
+    "--target",
+    help="Target languages, separated by commas",
+    default="fr",
+)
+args.add_argument(
+    "--compression-level",
+    help="gzip compression level of the new chatbots",
+    type=int,
+    default=9,
+)
+args.add_argument(
+    "-o",
+    "--output",
+    help="Path to the JSON file where the results are written",
+    default="benchmark_results.json",
+)
+args.add_argument(
+    "--baseline",
+    help="Results of a previous run, the stages slower by more than the tolerance are reported as regressions",
+    default="",
+)
+args.add_argument(
+    "--tolerance",
+    help="Slowdown tolerated before reporting a regression, 0.2 for 20%%",
+    type=float,
+    default=0.2,
+)
+
+if __name__ == "__main__":
+    args = args.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    targets = [target.strip() for target in args.target.split(",") if target.strip()]
+    # The baseline is read first, it may be the output file of the previous run
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            print("Benchmarking a chatbot with %d texts" % size)
+            stages = run(size, directory, targets, int(args.media * 1024 * 1024), args.compression_level)
+            results["sizes"][str(size)] = stages
+            for stage in ("generate", "extract", "load excel", "save excel", "pack"):
+                print("  %-12s %8.3f s" % (stage, stages[stage]))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print("Results written to " + args.output)
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for size, stage, previous, seconds in regressions:
+            print("Regression: %s with %s texts took %.3f s instead of %.3f s" % (stage, size, seconds, previous))
+        if regressions:
+            exit(1)
+        print("No regression 🥳")
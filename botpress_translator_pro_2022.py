@@ -1,43 +1,47 @@
 # Python Script to manage translation of botpress chatbots
 
 # Arguments:
-# 2 modes, either extract or pack
+# Modes: extract, pack, validate (check the translations without packing),
+# stats (count the texts of the chatbot), estimate (volume and cost of the translation,
+# without translating) or serve (HTTP service, see server.py)
 # Takes a botpress chatbot path argument (.tgz file)
 # Extract mode: Generate an excel file with all the translations needed
 # Pack mode: Generate a new botpress chatbot from an excel file and the original chatbot
 # Source language: The language of the original chatbot, default to english
-# Target language: The language of the new chatbot, default to french
+# Target languages: The languages of the new chatbots, separated by commas, default to french
 
 import argparse
-from distutils.util import strtobool
-import glob
-from extract import extract
-from pack import pack
+import os
+from arguments import parse_bool, split_list
+from fastjson import STYLES
+from metrics import metrics, profile
+
+# The modules of the modes are imported when they are used, so the quick modes start fast
 
 args = argparse.ArgumentParser()
 args.add_argument(
     "-m",
     "--mode",
     help="Mode of operation",
-    choices=["extract", "pack"],
+    choices=["extract", "pack", "validate", "stats", "estimate", "serve"],
     default="extract",
 )
 args.add_argument(
     "-b",
     "--bot",
-    help="Path to the botpress chatbot to extract or pack",
+    help="Path to the botpress chatbot to extract or pack, a pattern or a directory matching several chatbots processes all of them",
     default="*.tgz",
 )
 args.add_argument(
     "-e",
     "--excel",
-    help="Path to the excel file to extract or pack",
+    help="Path to the translation file (excel, csv, jsonl or xliff) to extract or pack, several files separated by commas can be packed together, with several chatbots translations.xlsx becomes <bot>_translations.xlsx, or {bot} is replaced by the chatbot name",
     default="translations.xlsx",
 )
 args.add_argument(
     "-p",
     "--previous",
-    help="Path to the excel file containing the previous translations",
+    help="Path to the translation file containing the previous translations",
     default="",
 )
 args.add_argument(
@@ -49,43 +53,299 @@ args.add_argument(
 args.add_argument(
     "-t",
     "--target",
-    help="Target language of the chatbot, default to french",
+    help="Target languages of the chatbot, separated by commas, default to french",
     default="fr",
 )
 
 args.add_argument(
     '-n',
     '--new',
-    help='Path to the new chatbot',
+    help='Path to the new chatbot, with several target languages new.tgz becomes new_<language>.tgz, or {lang} is replaced by the language',
     default='new.tgz'
 )
 
 args.add_argument(
     '-g',
     '--google',
-    help='Should the file be translated using google translate',
+    help='Should the file be translated automatically, using the translation backend',
+    type=parse_bool,
     default=True,
 )
 
-if __name__ == "__main__":
-    args = args.parse_args()
+args.add_argument(
+    "--backend",
+    help="Translation backend: google (Google Translate), marian (offline MarianMT models), fake (for tests) or copy (no translation)",
+    choices=["google", "marian", "fake", "copy"],
+    default="google",
+)
+
+args.add_argument(
+    "--placeholders",
+    help="Should the template variables, URLs and inline code be protected from the translation",
+    type=parse_bool,
+    default="true",
+)
+
+args.add_argument(
+    "--fuzzy",
+    help="Extract mode: minimum similarity, from 0 to 1, of a previous text whose translation is proposed for review instead of translating, 0 to disable",
+    type=float,
+    default=0.85,
+)
+
+args.add_argument(
+    "--resume",
+    help="Extract mode: reuse the translations saved in the journal of an interrupted extraction, instead of translating them again",
+    type=parse_bool,
+    default="false",
+)
+
+args.add_argument(
+    "--memory",
+    help="Path to the translation memory caching the Google Translate results, empty to disable it",
+    default="translation_memory.sqlite",
+)
+
+args.add_argument(
+    "--workers",
+    help="Number of concurrent requests sent to the translation backend",
+    type=int,
+    default=4,
+)
+
+args.add_argument(
+    "--rate",
+    help="Maximum number of characters sent to the translation backend per second, default to the quota of the backend",
+    type=int,
+    default=None,
+)
+
+args.add_argument(
+    "--processes",
+    help="Number of processes used to process several chatbots, default to the number of CPUs",
+    type=int,
+    default=None,
+)
+
+args.add_argument(
+    "-f",
+    "--format",
+    help="Format of the translation file, guessed from its extension by default",
+    choices=["auto", "xlsx", "csv", "jsonl", "xliff", "xliff2"],
+    default="auto",
+)
+
+args.add_argument(
+    "--compression-level",
+    help="gzip compression level of the new chatbot, from 0 (no compression) to 9 (smallest)",
+    type=int,
+    choices=range(0, 10),
+    default=9,
+)
+
+args.add_argument(
+    "--compression-threads",
+    help="Number of threads compressing the new chatbot",
+    type=int,
+    default=1,
+)
+
+args.add_argument(
+    "--dry-run",
+    help="Pack mode: only check the translations against the chatbot, without writing the new chatbot",
+    type=parse_bool,
+    default="false",
+)
+
+args.add_argument(
+    "--multilingual",
+    help="Pack mode: write a single chatbot with the translations of all the target languages, in text$<language> fields",
+    type=parse_bool,
+    default="false",
+)
+
+args.add_argument(
+    "--json-style",
+    help="Pack mode: formatting of the content element files, compat is the formatting of botpress, compact is smaller and faster",
+    choices=STYLES,
+    default="compat",
+)
+
+args.add_argument(
+    "--host",
+    help="Serve mode: address of the HTTP service",
+    default="127.0.0.1",
+)
+
+args.add_argument(
+    "--port",
+    help="Serve mode: port of the HTTP service",
+    type=int,
+    default=8080,
+)
+
+args.add_argument(
+    "--jobs",
+    help="Serve mode: number of jobs run at the same time",
+    type=int,
+    default=2,
+)
+
+args.add_argument(
+    "--directory",
+    help="Serve mode: working directory of the uploaded and generated files",
+    default="translator_files",
+)
+
+args.add_argument(
+    "--metrics",
+    help="Path to a JSON file where the timings and counters of the run are written",
+    default="",
+)
+
+args.add_argument(
+    "--profile",
+    help="Path to a file where the cProfile statistics of the run are written",
+    default="",
+)
+
+
+def main(args):
+    if args.mode == "serve":
+        from server import serve
 
-    # If the bot path contains an star, find the first file that matches the pattern
+        serve(args.host, args.port, args.directory, args.jobs, args.memory)
+        return
+
+    # If the bot path contains an star or is a directory, find the files that match the pattern
     bot_path = args.bot
-    if "*" in bot_path:
-        bot_path = glob.glob(bot_path)[0]
-        if not bot_path:
+    if "*" in bot_path or os.path.isdir(bot_path):
+        from archive import find_bots
+
+        bot_paths = find_bots(bot_path)
+        if not bot_paths:
             print("No bot found for path " + bot_path)
             exit(1)
+        bot_path = bot_paths[0]
+    else:
+        bot_paths = [bot_path]
+
+    targets = split_list(args.target)
+    # Several translation files, separated by commas, can be packed together
+    excel_paths = split_list(args.excel)
+    if len(excel_paths) == 1:
+        excel_paths = excel_paths[0]
+
+    if args.mode == "stats":
+        from stats import print_stats
+
+        for bot_path in bot_paths:
+            print_stats(bot_path)
+        return
+
+    if args.mode == "estimate":
+        from estimate import print_estimate
+
+        for bot_path in bot_paths:
+            previous = args.previous
+            if len(bot_paths) > 1:
+                # The previous translation file is per bot, as in the batch mode
+                from batch import bot_file_path
+
+                previous = bot_file_path(args.previous, bot_path)
+            print_estimate(
+                bot_path,
+                args.source,
+                targets,
+                backend=args.backend if args.google else "copy",
+                previous=previous,
+                memory=args.memory,
+                mask_placeholders=args.placeholders,
+                fuzzy_threshold=args.fuzzy,
+            )
+        return
+
+    # The validate mode is a dry run of the pack mode
+    dry_run = args.dry_run or args.mode == "validate"
+
+    # Several bots are processed in batch mode
+    if len(bot_paths) > 1:
+        from batch import batch_extract, batch_pack, print_summary
+
+        if args.mode == "extract":
+            results = batch_extract(
+                bot_paths,
+                excel_path=args.excel,
+                source=args.source,
+                targets=targets,
+                use_google_translate=args.google,
+                previous=args.previous,
+                memory=args.memory,
+                max_workers=args.workers,
+                characters_per_second=args.rate,
+                processes=args.processes,
+                format=args.format,
+                backend=args.backend,
+                mask_placeholders=args.placeholders,
+                fuzzy_threshold=args.fuzzy,
+                resume=args.resume,
+            )
+        else:
+            results = batch_pack(
+                bot_paths,
+                excel_paths,
+                args.new,
+                targets,
+                processes=args.processes,
+                format=args.format,
+                compression_level=args.compression_level,
+                compression_threads=args.compression_threads,
+                dry_run=dry_run,
+                json_style=args.json_style,
+                multilingual=args.multilingual,
+            )
+        print_summary(results)
+        if any(error is not None for error in results.values()):
+            exit(1)
+    elif args.mode == "extract":
+        from extract import extract
 
-    if args.mode == "extract":
         extract(
             bot_path,
             excel_path=args.excel,
             source=args.source,
-            target=args.target,
-            use_google_translate=strtobool(args.google),
+            targets=targets,
+            use_google_translate=args.google,
             previous=args.previous,
+            memory=args.memory,
+            max_workers=args.workers,
+            characters_per_second=args.rate,
+            format=args.format,
+            backend=args.backend,
+            mask_placeholders=args.placeholders,
+            fuzzy_threshold=args.fuzzy,
+            resume=args.resume,
+        )
+    else:
+        from pack import pack
+
+        pack(
+            bot_path,
+            excel_paths,
+            args.new,
+            targets,
+            format=args.format,
+            compression_level=args.compression_level,
+            compression_threads=args.compression_threads,
+            dry_run=dry_run,
+            json_style=args.json_style,
+            multilingual=args.multilingual,
         )
-    elif args.mode == "pack":
-        pack(bot_path, args.excel, args.new)
+
+if __name__ == "__main__":
+    args = args.parse_args()
+    with profile(args.profile):
+        main(args)
+    # Only the metrics of this process are reported, not the ones of the batch mode processes
+    if args.metrics:
+        metrics.write(args.metrics)
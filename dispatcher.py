@@ -0,0 +1,135 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from metrics import metrics
+
+# Limits of the Google Translate API (basic edition)
+# See https://cloud.google.com/translate/quotas
+MAX_TEXTS_PER_REQUEST = 128
+MAX_CHARACTERS_PER_REQUEST = 30000
+MAX_BYTES_PER_REQUEST = 204800
+# The default quota is 6 000 000 characters per minute
+DEFAULT_CHARACTERS_PER_SECOND = 100000
+
+
+class TokenBucket:
+    """Thread-safe token bucket, refilled with rate tokens per second"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens):
+        # A request bigger than the bucket would wait forever
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.timestamp) * self.rate
+                )
+                self.timestamp = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CancelledDispatch(Exception):
+    """Raised for the chunks not sent because another chunk failed"""
+
+
+def split_chunks(
+    texts,
+    max_texts=MAX_TEXTS_PER_REQUEST,
+    max_characters=MAX_CHARACTERS_PER_REQUEST,
+    max_bytes=MAX_BYTES_PER_REQUEST,
+):
+    """Splits texts in chunks respecting the number of texts, characters and payload size limits.
+
+    A text that is bigger than the limits on its own is sent in its own chunk.
+    """
+    chunks = []
+    chunk = []
+    characters = 0
+    size = 0
+    for text in texts:
+        # The texts are sent JSON encoded, separated by commas
+        text_size = len(json.dumps(text)) + 1
+        if chunk and (
+            len(chunk) >= max_texts
+            or characters + len(text) > max_characters
+            or size + text_size > max_bytes
+        ):
+            chunks.append(chunk)
+            chunk = []
+            characters = 0
+            size = 0
+        chunk.append(text)
+        characters += len(text)
+        size += text_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def is_quota_error(error):
+    # google.api_core exceptions have the HTTP status code in the code attribute
+    code = getattr(error, "code", None)
+    if code in (429, 503):
+        return True
+    return code == 403 and "rateLimitExceeded" in str(error)
+
+
+def dispatch(chunks, send, max_workers=4, characters_per_second=None, retries=5, backoff=1.0, characters=None):
+    """Calls send on every chunk concurrently and returns the results in the order of the chunks.
+
+    At most max_workers requests are in flight, and the number of characters
+    sent per second is limited by a token bucket. Requests failing because of
+    a quota error are retried with an exponential backoff. When a chunk fails,
+    the chunks not sent yet are cancelled and the error is raised.
+    characters returns the number of characters of a chunk, by default a chunk is a list of texts.
+    """
+    bucket = TokenBucket(characters_per_second) if characters_per_second else None
+    # Set when a chunk failed, the other chunks are not sent or retried anymore
+    failed = threading.Event()
+
+    def send_with_retries(chunk):
+        if bucket:
+            bucket.acquire(characters(chunk) if characters else sum(len(text) for text in chunk))
+        for attempt in range(retries + 1):
+            if failed.is_set():
+                raise CancelledDispatch()
+            metrics.count("api calls")
+            try:
+                return send(chunk)
+            except Exception as error:
+                if attempt == retries or not is_quota_error(error):
+                    failed.set()
+                    raise
+                metrics.count("api retries")
+                # Wait before retrying, unless another chunk fails meanwhile
+                failed.wait(backoff * 2**attempt * (1 + random.random()))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [executor.submit(send_with_retries, chunk) for chunk in chunks]
+        wait(futures, return_when=FIRST_EXCEPTION)
+        if failed.is_set():
+            executor.shutdown(cancel_futures=True)
+            # Raise the error of the failed chunk, not of the chunks stopped by it
+            for future in futures:
+                if future.cancelled() or isinstance(future.exception(), CancelledDispatch):
+                    continue
+                if future.exception():
+                    raise future.exception()
+        return [future.result() for future in futures]
+    finally:
+        executor.shutdown(cancel_futures=True)
@@ -0,0 +1,102 @@
+import os
+
+from backends import get_backend
+from dispatcher import split_chunks
+from extract import (
+    DEFAULT_FUZZY_THRESHOLD,
+    carry_over_unchanged,
+    elements_entries,
+    find_fuzzy_matches,
+    find_texts_to_translate,
+    load_previous_translations,
+    mask_texts,
+    previous_english_texts,
+    read_elements,
+)
+from manifest import element_hashes
+from translation_memory import TranslationMemory
+
+
+def estimate(
+    bot_path,
+    source,
+    targets,
+    previous="",
+    memory=None,
+    backend="google",
+    mask_placeholders=True,
+    fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD,
+):
+    """Estimates the volume and the cost of the translation of a bot, without translating anything.
+
+    The texts are selected as extract does: the texts of the previous translation
+    file, the similar texts and the texts of the translation memory are not
+    translated again. Returns a dictionary per target language with the numbers
+    of texts found, texts to translate, characters and API calls, and the cost in dollars.
+    """
+    if isinstance(targets, str):
+        targets = [targets]
+    backend = get_backend(backend)
+
+    translations = load_previous_translations(previous, targets)
+    elements = read_elements(bot_path)
+    entries = elements_entries(elements)
+    carried_over = carry_over_unchanged(elements, element_hashes(elements), previous, translations)
+    texts_to_translate = find_texts_to_translate(
+        entries, targets, carried_over, previous_english_texts(translations)
+    )
+    fuzzy_matches = find_fuzzy_matches(texts_to_translate, translations, fuzzy_threshold)
+    texts_to_translate = {
+        target: [text for text in texts if text not in fuzzy_matches[target]]
+        for target, texts in texts_to_translate.items()
+    }
+    _, templates_to_translate = mask_texts(texts_to_translate, mask_placeholders)
+
+    # The translation memory is only read, and not created when it doesn't exist
+    if memory and backend.use_memory and os.path.exists(memory):
+        translation_memory = TranslationMemory(memory)
+        for target in targets:
+            remembered = translation_memory.lookup(templates_to_translate[target], source, target, touch=False)
+            templates_to_translate[target] = [
+                template for template in templates_to_translate[target] if template not in remembered
+            ]
+        translation_memory.close()
+
+    estimates = dict()
+    for target in targets:
+        templates = [template for template in templates_to_translate[target] if template is not None]
+        chunks = split_chunks(
+            templates,
+            max_texts=backend.max_texts_per_request,
+            max_characters=backend.max_characters_per_request,
+            max_bytes=backend.max_bytes_per_request,
+        )
+        estimates[target] = dict(
+            texts=len(entries),
+            unique=len(templates),
+            characters=sum(len(template) for template in templates),
+            calls=len(chunks),
+            cost=backend.estimate_cost(templates),
+        )
+    return estimates
+
+
+def print_estimate(bot_path, source, targets, backend="google", **options):
+    estimates = estimate(bot_path, source, targets, backend=backend, **options)
+    print(f"Estimate of the translation of the bot {bot_path} using {get_backend(backend).name}")
+    print("%-10s %8s %12s %11s %10s %10s" % ("Language", "Texts", "To translate", "Characters", "API calls", "Cost"))
+    for target, target_estimate in estimates.items():
+        print(
+            "%-10s %8d %12d %11d %10d %10s"
+            % (
+                target,
+                target_estimate["texts"],
+                target_estimate["unique"],
+                target_estimate["characters"],
+                target_estimate["calls"],
+                "$%.2f" % target_estimate["cost"],
+            )
+        )
+    characters = sum(target_estimate["characters"] for target_estimate in estimates.values())
+    cost = sum(target_estimate["cost"] for target_estimate in estimates.values())
+    print(f"{characters} characters to translate, about ${cost:.2f}")
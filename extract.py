@@ -1,287 +1,377 @@
-import json
-import tarfile
-import tempfile
-import openpyxl
+from translate import translate_targets
+from backends import get_backend
+from formats import Record, load_translations, write_translations
+from archive import iter_members
+from schema import SCHEMA, iter_elements, load_document, sort_members
+from manifest import compare_manifests, element_hashes, load_manifest, manifest_path, write_manifest
+from translation_memory import TranslationMemory
+from placeholders import mask, unmask
+from metrics import metrics
+from fuzzy import FuzzyIndex
+from journal import Journal, journal_path
+from progress import Progress
 
-from translate import translate
-from load_translations_from_excel import load_translations_from_excel
+# Minimum similarity, from 0 to 1, of the previous texts whose translation is proposed for review
+DEFAULT_FUZZY_THRESHOLD = 0.85
 
 
-def extract(bot_path, excel_path, source, target, use_google_translate, previous):
+def extract(
+    bot_path,
+    excel_path,
+    source,
+    targets,
+    use_google_translate,
+    previous,
+    memory=None,
+    max_workers=4,
+    characters_per_second=None,
+    format="auto",
+    backend="google",
+    mask_placeholders=True,
+    previous_translations=None,
+    fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD,
+    resume=False,
+):
+    # A single target language can be given as a string
+    if isinstance(targets, str):
+        targets = [targets]
+    # Without automatic translation, the translations are copies of the texts
+    if not use_google_translate:
+        backend = "copy"
 
-    if previous:
-        translations = load_translations_from_excel(previous)
-    else:
-        translations = dict()
+    # The translations of the previous translation file may already be loaded, see server.py
+    with metrics.timer("load previous translations"):
+        if previous_translations is not None:
+            translations = previous_translations
+        else:
+            translations = load_previous_translations(previous, targets)
 
     print("Loading texts from bot " + bot_path)
-    # Extract the bot to a temporary directory
-    with tempfile.TemporaryDirectory() as temporary_directory:
-        # Extract the .tgz file in python
-        with tarfile.open(bot_path, "r:gz") as tar:
-            tar.extractall(temporary_directory)
-        # Open content-elements/builtin_text.json
-        with open(
-            temporary_directory + "/content-elements/builtin_text.json", "r"
-        ) as f:
-            # read and parse json
-            builtin_texts = json.load(f)
-            # builtin_text is an array of objects containing an id and a formData object
-            entries = [
-                (entry["id"], entry["formData"]["text$en"]) for entry in builtin_texts
+    elements = read_elements(bot_path)
+    entries = elements_entries(elements)
+
+    # Keep the translations of the elements that didn't change since the previous extraction
+    hashes = element_hashes(elements)
+    carried_over = carry_over_unchanged(elements, hashes, previous, translations)
+
+    # Remove entries that are already translated, and the duplicates once for all the target languages
+    english_translations = previous_english_texts(translations)
+    texts_to_translate = find_texts_to_translate(entries, targets, carried_over, english_translations)
+    metrics.count("strings found", len(entries))
+    metrics.count("unique strings", len(set().union(*texts_to_translate.values())))
+
+    # Propose the previous translations of similar texts instead of translating them
+    fuzzy_matches = find_fuzzy_matches(texts_to_translate, translations, fuzzy_threshold)
+    texts_to_translate = {
+        target: [text for text in texts if text not in fuzzy_matches[target]]
+        for target, texts in texts_to_translate.items()
+    }
+
+    # The translations are saved to a journal until the translation file is written, see journal.py
+    journal = Journal(journal_path(excel_path), resume, journal_options(backend, mask_placeholders))
+    try:
+        with metrics.timer("translate"):
+            translated_texts = translate_texts(
+                texts_to_translate,
+                source,
+                backend,
+                memory=memory,
+                max_workers=max_workers,
+                characters_per_second=characters_per_second,
+                mask_placeholders=mask_placeholders,
+                journal=journal,
+            )
+    finally:
+        journal.close()
+
+    all_translated_texts = merge_translations(translated_texts, translations)
+
+    records = build_records(
+        entries,
+        targets,
+        all_translated_texts,
+        english_translations if previous else None,
+        carried_over,
+        fuzzy_matches,
+    )
+    with metrics.timer("write translations"):
+        write_translations(excel_path, records, source, targets, format)
+    write_manifest(manifest_path(excel_path), hashes)
+    journal.remove()
+    print("Done 🥳")
+
+
+def load_previous_translations(previous, targets):
+    """Returns a dictionary per target language of the translations of the previous translation file"""
+    # translations is a dictionary of tuples (english, translation)
+    if previous:
+        return load_translations(previous, targets, required=False)
+    return {target: dict() for target in targets}
+
+
+def previous_english_texts(translations):
+    """Returns the set of the english texts already translated per target language"""
+    return {
+        target: set([translation[0] for translation in target_translations.values()])
+        for target, target_translations in translations.items()
+    }
+
+
+def read_elements(bot_path):
+    """Returns the texts to translate of a bot, grouped by element.
+
+    The result is a dictionary with the file and id of the element as key
+    (content-elements/builtin_text.json#id) and the list of the (identifier, text)
+    of the element as value.
+    """
+    # The files are parsed as they are read from the archive, the parsing is bound by the CPU
+    # and the GIL, parsing them in threads is not faster
+    with metrics.timer("read and parse"):
+        files = {name: read_file_elements(name, content) for name, content in iter_members(bot_path, SCHEMA.keys())}
+        elements = dict()
+        for name in sort_members(files):
+            for element_id, entries in files[name]:
+                elements.setdefault(name + "#" + element_id, []).extend(entries)
+    return elements
+
+
+def read_file_elements(name, content):
+    """Returns the list of the (element id, list of (identifier, text)) of a file of the bot"""
+    document = load_document(name, content)
+    return [
+        (element_id, [(identifier, container[key]) for identifier, container, key in texts])
+        for element_id, texts in iter_elements(name, document)
+    ]
+
+
+def find_texts_to_translate(entries, targets, carried_over, english_translations):
+    """Returns the list of the distinct texts to translate per target language.
+
+    The texts of the entries carried over and the texts already translated are removed.
+    """
+    return {
+        target: list(dict.fromkeys(
+            text
+            for identifier, text in entries
+            if identifier not in carried_over[target] and text not in english_translations[target]
+        ))
+        for target in targets
+    }
+
+
+def find_fuzzy_matches(texts_to_translate, translations, threshold=DEFAULT_FUZZY_THRESHOLD):
+    """Finds the previous translations of the texts similar to the texts to translate.
+
+    Returns a dictionary per target language with the text as key and the
+    (similar text, translation, similarity) as value. A threshold of 0
+    disables the fuzzy matching.
+    """
+    fuzzy_matches = {target: dict() for target in texts_to_translate}
+    if not threshold:
+        return fuzzy_matches
+    with metrics.timer("fuzzy matching"):
+        for target, texts in texts_to_translate.items():
+            if not texts or not translations.get(target):
+                continue
+            # The previous translations are tuples (english, translation)
+            index = FuzzyIndex(dict(translations[target].values()))
+            for text in texts:
+                match = index.lookup(text, threshold)
+                # The translation of a text with other placeholders would have the wrong placeholders
+                if match and mask(match[0])[1] == mask(text)[1]:
+                    fuzzy_matches[target][text] = match
+            if fuzzy_matches[target]:
+                print(f"Found {len(fuzzy_matches[target])} {target} texts similar to previous translations, to review")
+            metrics.count("fuzzy matches", len(fuzzy_matches[target]))
+    return fuzzy_matches
+
+
+def elements_entries(elements):
+    """Returns the list of (identifier, text) of all the elements"""
+    return [entry for entries in elements.values() for entry in entries]
+
+
+def carry_over_unchanged(elements, hashes, previous, translations):
+    """Returns the previous translations of the elements that didn't change, per target language.
+
+    The elements are compared with the manifest of the previous translation file,
+    without manifest nothing is carried over.
+    """
+    carried_over = {target: dict() for target in translations}
+    previous_hashes = load_manifest(manifest_path(previous)) if previous else None
+    if previous_hashes is None:
+        return carried_over
+
+    unchanged, changed, added, removed = compare_manifests(previous_hashes, hashes)
+    print(
+        f"{len(unchanged)} unchanged elements, {len(changed)} changed, "
+        f"{len(added)} added and {len(removed)} removed since the previous extraction"
+    )
+    for key in sorted(removed):
+        print("Removed element: " + key)
+
+    for key in unchanged:
+        for identifier, _ in elements[key]:
+            for target, target_translations in translations.items():
+                if identifier in target_translations:
+                    carried_over[target][identifier] = target_translations[identifier][1]
+    return carried_over
+
+
+def journal_options(backend, mask_placeholders):
+    """Returns the options of the translations saved to a journal, they are only reused with the same options"""
+    return {"backend": get_backend(backend).name, "placeholders": mask_placeholders}
+
+
+def translate_texts(
+    texts_to_translate,
+    source,
+    backend,
+    memory=None,
+    max_workers=4,
+    characters_per_second=None,
+    mask_placeholders=True,
+    journal=None,
+):
+    """Translates a list of texts per target language with a translation backend.
+
+    Returns a dictionary per target language with the text as key and its translation as value.
+    With mask_placeholders, the placeholders of the texts (template variables, URLs…)
+    are replaced by tokens before translating, so they are not translated and
+    texts that only differ by their placeholders are translated once.
+    The translations are saved to the journal as they are received, and the
+    translations already in the journal are not translated again.
+    """
+    targets = list(texts_to_translate)
+    backend = get_backend(backend)
+
+    # The templates are translated instead of the texts
+    masked_texts, templates_to_translate = mask_texts(texts_to_translate, mask_placeholders)
+
+    # Reuse the translations of the translation memory
+    remembered_templates = {target: dict() for target in targets}
+    use_memory = memory and backend.use_memory
+    if use_memory:
+        # memory is the path of the translation memory, or a translation memory kept open by the caller
+        translation_memory = memory if isinstance(memory, TranslationMemory) else TranslationMemory(memory)
+        for target in targets:
+            remembered_templates[target] = translation_memory.lookup(templates_to_translate[target], source, target)
+            templates_to_translate[target] = [
+                template for template in templates_to_translate[target] if template not in remembered_templates[target]
             ]
+            print(f"Found {len(remembered_templates[target])} {target} texts in the translation memory")
 
-        # Open content-elements/builtin_card.json
-        with open(
-            temporary_directory + "/content-elements/builtin_card.json", "r"
-        ) as f:
-            # read and parse json
-            builtin_cards = json.load(f)
-            # builtin_card is an array of objects containing an id and a formData object
-            for builtin_card in builtin_cards:
-                entries.append(
-                    (
-                        builtin_card["id"] + ".title",
-                        builtin_card["formData"]["title$en"],
-                    )
-                )
-                if "subtitle$en" in builtin_card["formData"]:
-                    entries.append(
-                        (
-                            builtin_card["id"] + ".subtitle",
-                            builtin_card["formData"]["subtitle$en"],
-                        )
-                    )
-                for index, option in enumerate(builtin_card["formData"]["actions$en"]):
-                    entries.append(
-                        (
-                            builtin_card["id"] + ".actionTitle[" + str(index) + "]",
-                            option["title"],
-                        )
-                    )
-                    if "text" in option:
-                        entries.append(
-                            (
-                                builtin_card["id"] + ".actionText[" + str(index) + "]",
-                                option["text"],
-                            )
-                        )
-        # Open content-elements/builtin_carousel.json
-        with open(
-            temporary_directory + "/content-elements/builtin_carousel.json", "r"
-        ) as f:
-            # read and parse json
-            builtin_carousels = json.load(f)
-            # builtin_carousel is an array of objects containing an id and a formData object
-            for builtin_carousel in builtin_carousels:
-                for index, item in enumerate(builtin_carousel["formData"]["items$en"]):
-                    entries.append(
-                        (
-                            builtin_carousel["id"] + ".itemTitle[" + str(index) + "]",
-                            item["title"],
-                        )
-                    )
-                    for actionIndex, option in enumerate(item["actions"]):
-                        entries.append(
-                            (
-                                builtin_carousel["id"]
-                                + ".itemActionTitle["
-                                + str(index)
-                                + "]["
-                                + str(actionIndex)
-                                + "]",
-                                option["title"],
-                            )
-                        )
-        # Open content-elements/builtin_image.json
-        with open(
-            temporary_directory + "/content-elements/builtin_image.json", "r"
-        ) as f:
-            # read and parse json
-            builtin_images = json.load(f)
-            # builtin_image is an array of objects containing an id and a formData object
-            for builtin_image in builtin_images:
-                if "title$en" in builtin_image["formData"]:
-                    entries.append(
-                        (
-                            builtin_image["id"] + ".title",
-                            builtin_image["formData"]["title$en"],
-                        )
-                    )
-
-        # Open content-elements/builtin_single-choice.json
-        with open(
-            temporary_directory + "/content-elements/builtin_single-choice.json", "r"
-        ) as f:
-            # read and parse json
-            builtin_single_choices = json.load(f)
-            # builtin_single-choice is an array of objects containing an id and a formData object
-            for builtin_single_choice in builtin_single_choices:
-                entries.append(
-                    (
-                        builtin_single_choice["id"] + ".dropdown",
-                        builtin_single_choice["formData"]["dropdownPlaceholder$en"],
-                    )
-                )
-                if "text$en" in builtin_single_choice["formData"]:
-                    entries.append(
-                        (
-                            builtin_single_choice["id"] + ".text",
-                            builtin_single_choice["formData"]["text$en"],
-                        )
-                    )
-                for index, option in enumerate(
-                    builtin_single_choice["formData"]["choices$en"]
-                ):
-                    entries.append(
-                        (
-                            builtin_single_choice["id"] + ".choice[" + str(index) + "]",
-                            option["title"],
-                        )
-                    )
-        # We don't translate the videos automatically because they most likely need to be changed
-
-        # Open content-elements/dropdown.json
-        with open(temporary_directory + "/content-elements/dropdown.json", "r") as f:
-            # read and parse json
-            dropdowns = json.load(f)
-            # dropdown is an array of objects containing an id and a formData object
-            for dropdown in dropdowns:
-                entries.append(
-                    (
-                        dropdown["id"] + ".message",
-                        dropdown["formData"]["message$en"],
-                    )
-                )
-                entries.append(
-                    (
-                        dropdown["id"] + ".placeholderText",
-                        dropdown["formData"]["placeholderText$en"],
-                    )
-                )
-                for index, option in enumerate(dropdown["formData"]["options$en"]):
-                    entries.append(
-                        (
-                            dropdown["id"] + ".option[" + str(index) + "]",
-                            option["label"],
-                        )
-                    )
-
-        # Remove entries with the second tuple element being None
-        entries = [entry for entry in entries if entry[1] is not None]
-
-        # Remove entries that are already translated
-        # translations is a dictionary of tuples (english, translation)
-        english_translations = set([translation[0] for translation in translations.values()])
-        texts_to_translate = [text for _, text in entries if text not in english_translations]
-
-        # Translate the text using Google Translate API
-        if use_google_translate:
-            print(f"Translating {len(texts_to_translate)} texts using Google Translate")
-            translated_texts = translate(texts_to_translate, source, target)
-        else:
-            translated_texts = {input: input for input in texts_to_translate}
-
-
-        all_translated_texts = {**translated_texts, **{value[0]: value[1] for value in translations.values()}}
-
-        print("Writing Excel file...")
-        # Create a new excel file
-        wb = openpyxl.Workbook()
-        # Create a new sheet
-        ws = wb.active
-        ws.title = "Translations"
-        # Write the entries to the sheet
-        ws.append(["Identifier", "Original English Text", "Translation"])
-        # ws.append(entries)
-        for (id, text) in entries:
-            ws.append([id, text, all_translated_texts[text]])
-
-        idStyle = openpyxl.styles.NamedStyle(name="id")
-        idStyle.font = openpyxl.styles.Font(
-            bold=True,
-            name="Courier New",
-            size=9,
-        )
-        idStyle.fill = openpyxl.styles.PatternFill(
-            fgColor="EEEEEE",
-            fill_type="solid",
-        )
-        idStyle.alignment = openpyxl.styles.Alignment(
-            wrap_text=True,
-        )
-        headerStyle = openpyxl.styles.NamedStyle(name="header")
-        headerStyle.font = openpyxl.styles.Font(
-            bold=True,
-            size=10,
-            name="Calibri",
-        )
-        headerStyle.fill = openpyxl.styles.PatternFill(
-            fgColor="CCCCCC",
-            fill_type="solid",
-        )
-        originalStyle = openpyxl.styles.NamedStyle(name="original")
-        originalStyle.font = openpyxl.styles.Font(
-            name="Calibri",
-            # Dark brown colour
-            color="663300",
-            italic=True,
-        )
-        originalStyle.alignment = openpyxl.styles.Alignment(
-            vertical="top",
-            wrap_text=True,
-        )
-        translationStyle = openpyxl.styles.NamedStyle(name="translation")
-        translationStyle.font = openpyxl.styles.Font(
-            name="Calibri",
-        )
-        translationStyle.alignment = openpyxl.styles.Alignment(
-            vertical="top",
-            wrap_text=True,
-        )
-        newTranslationStyle = openpyxl.styles.NamedStyle(name="newTranslation")
-        newTranslationStyle.font = openpyxl.styles.Font(
-            name="Calibri",
-        )
-        newTranslationStyle.alignment = openpyxl.styles.Alignment(
-            vertical="top",
-            wrap_text=True,
-        )
-        newTranslationStyle.fill = openpyxl.styles.PatternFill(
-            # Light orange
-            fgColor="FFCC99",
-            fill_type="solid",
-        )
-        ws["A1"].style = idStyle
-        ws.column_dimensions["A"].width = 20
-        ws.column_dimensions["B"].width = 30
-        ws.column_dimensions["C"].width = 30
-
-        # Lock the cells that shouldn't be edited
-        ws.protection.sheet = True
-
-        # Set headers styles
-        for row in ws["A1":"C1"]:
-            for cell in row:
-                cell.style = headerStyle
-        # Set identifier styles
-        for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=1):
-            for cell in row:
-                cell.style = idStyle
-        # Set original text style
-        for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=2, max_col=2):
-            for cell in row:
-                cell.style = originalStyle
-        # Set translation styles
-        for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=3, max_col=3):
-            for cell in row:
-                cell.style = translationStyle
-                if previous:
-                    english_cell = cell.offset(column=-1)
-                    if not english_cell.value in english_translations:
-                        cell.style = newTranslationStyle
-                # Unlock the translation rows
-                cell.protection = openpyxl.styles.protection.Protection(locked=False)
-        wb.save(excel_path)
-        print("Excel file created: " + excel_path)
-        print("Done 🥳")
+    # Reuse the translations of an interrupted extraction
+    resumed_templates = {target: dict() for target in targets}
+    if journal:
+        for target in targets:
+            resumed_templates[target] = journal.lookup(templates_to_translate[target], source, target)
+            templates_to_translate[target] = [
+                template for template in templates_to_translate[target] if template not in resumed_templates[target]
+            ]
+            if resumed_templates[target]:
+                print(f"Found {len(resumed_templates[target])} {target} texts in the journal")
+
+    progress = Progress(
+        "Translating",
+        sum(len(template) for target in targets for template in templates_to_translate[target] if template),
+    )
+
+    def on_translated(target, translations):
+        if journal:
+            journal.add(translations, source, target)
+        progress.update(sum(len(template) for template in translations))
+
+    # Translate all the target languages in parallel, sharing the workers and the rate limit
+    for target in targets:
+        templates = templates_to_translate[target]
+        message = f"Translating {len(templates)} texts to {target} using {backend.name}"
+        if backend.cost_per_million_characters:
+            message += f" (about ${backend.estimate_cost(templates):.2f})"
+        print(message)
+    translated_templates = translate_targets(
+        templates_to_translate,
+        source,
+        backend=backend,
+        max_workers=max_workers,
+        characters_per_second=characters_per_second,
+        on_translated=on_translated,
+    )
+    translated_templates = {
+        target: {**resumed_templates[target], **translated_templates[target]} for target in targets
+    }
+    if progress.total:
+        progress.finish()
+
+    if use_memory:
+        for target in targets:
+            translation_memory.update(translated_templates[target], source, target)
+        if translation_memory is not memory:
+            translation_memory.close()
+
+    # Put the placeholders back in the translations
+    translated_texts = dict()
+    for target in targets:
+        all_templates = {**remembered_templates[target], **translated_templates[target]}
+        translated_texts[target] = dict()
+        for text in texts_to_translate[target]:
+            template, values = masked_texts[text]
+            translated_texts[target][text] = unmask(all_templates.get(template), values)
+    return translated_texts
+
+
+def mask_texts(texts_to_translate, mask_placeholders=True):
+    """Replaces the placeholders of the texts to translate by tokens, see placeholders.py.
+
+    Returns a dictionary with the text as key and its (template, values) as value,
+    and the list of the distinct templates to translate per target language.
+    """
+    masked_texts = dict()
+    templates_to_translate = dict()
+    for target, texts in texts_to_translate.items():
+        for text in texts:
+            if text not in masked_texts:
+                masked_texts[text] = mask(text) if mask_placeholders else (text, [])
+        templates_to_translate[target] = list(dict.fromkeys(masked_texts[text][0] for text in texts))
+    return masked_texts, templates_to_translate
+
+
+def merge_translations(translated_texts, translations):
+    """Adds the translations of the previous translation file to the translated texts"""
+    return {
+        target: {
+            **translated_texts[target],
+            **{value[0]: value[1] for value in translations[target].values()},
+        }
+        for target in translated_texts
+    }
+
+
+def build_records(
+    entries, targets, all_translated_texts, english_translations=None, carried_over=None, fuzzy_matches=None
+):
+    """Yields the records of the translation file.
+
+    When english_translations is given, the texts that are not in it are marked as new translations.
+    The translations of carried_over (per target language and identifier) are kept as they are.
+    The translations of fuzzy_matches (see find_fuzzy_matches) are marked for review.
+    """
+    carried_over = carried_over or {target: dict() for target in targets}
+    fuzzy_matches = fuzzy_matches or {target: dict() for target in targets}
+    for (id, text) in entries:
+        translations = dict()
+        new = set()
+        review = dict()
+        for target in targets:
+            if id in carried_over[target]:
+                translations[target] = carried_over[target][id]
+                continue
+            if text in fuzzy_matches[target]:
+                similar, translations[target], similarity = fuzzy_matches[target][text]
+                review[target] = (similar, similarity)
+                continue
+            translations[target] = all_translated_texts[target][text]
+            if english_translations is not None and text not in english_translations[target]:
+                new.add(target)
+        metrics.count("rows written")
+        yield Record(id, text, translations, new, review)
@@ -0,0 +1,127 @@
+# JSON parsing and serialization of the content element files
+#
+# orjson or msgspec are used when they are installed, the json module of the
+# standard library otherwise. Both are optional: pip install orjson
+
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Errors of the parsers when a document is only accepted by the standard library,
+# msgspec.DecodeError isn't a ValueError
+DECODE_ERRORS = (ValueError, msgspec.DecodeError) if msgspec else (ValueError,)
+
+# Output styles of dumps:
+#   compat: same bytes as json.dumps(indent=2, ensure_ascii=False), like the botpress exports
+#   compact: no indentation and no spaces, smaller and faster to write
+STYLES = ["compat", "compact"]
+
+# Bigger files are parsed one element at a time by iter_array
+STREAMING_THRESHOLD = 8 * 1024 * 1024
+
+
+def backend_name():
+    if orjson:
+        return "orjson"
+    if msgspec:
+        return "msgspec"
+    return "json"
+
+
+def loads(data):
+    """Parses a JSON document from bytes or a string"""
+    try:
+        if orjson:
+            return orjson.loads(data)
+        if msgspec:
+            return msgspec.json.decode(data)
+    except DECODE_ERRORS:
+        # NaN, lone surrogates... are accepted by the standard library only
+        pass
+    return json.loads(data)
+
+
+def dumps(value, style="compat"):
+    """Serializes a value to UTF-8 encoded JSON bytes, see STYLES"""
+    if style not in STYLES:
+        raise Exception("Unknown JSON style " + str(style))
+    try:
+        # orjson and msgspec write NaN and Infinity as null, the standard library keeps them
+        if style == "compact" and not has_special_floats(value):
+            if orjson:
+                return orjson.dumps(value)
+            if msgspec:
+                return msgspec.json.encode(value)
+        elif style == "compat" and orjson and not has_special_floats(value):
+            return orjson.dumps(value, option=orjson.OPT_INDENT_2)
+    except TypeError:
+        # Integers bigger than 64 bits, non string keys...
+        pass
+    if style == "compact":
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return json.dumps(value, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def has_special_floats(value):
+    """Whether value contains floats that orjson doesn't format like the standard library.
+
+    orjson writes 1e16 and null where the standard library writes 1e+16 and NaN,
+    msgspec writes null for NaN too.
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, float) and (not math.isfinite(value) or "e" in repr(value)):
+            return True
+    return False
+
+
+def iter_array(data):
+    """Yields the items of a JSON array one by one.
+
+    Small documents are parsed at once. Documents bigger than
+    STREAMING_THRESHOLD are decoded one item at a time, so the tree of the
+    whole document is never in memory.
+    """
+    if len(data) < STREAMING_THRESHOLD:
+        yield from loads(data)
+        return
+
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    decoder = json.JSONDecoder()
+    position = skip_whitespace(data, 0)
+    if data[position : position + 1] != "[":
+        raise ValueError("Expected a JSON array")
+    position = skip_whitespace(data, position + 1)
+    if data[position : position + 1] == "]":
+        return
+    while True:
+        item, position = decoder.raw_decode(data, position)
+        yield item
+        position = skip_whitespace(data, position)
+        separator = data[position : position + 1]
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError("Expected , or ] at position %d" % position)
+        position = skip_whitespace(data, position + 1)
+
+
+def skip_whitespace(data, position):
+    while position < len(data) and data[position] in " \t\n\r":
+        position += 1
+    return position
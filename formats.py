@@ -0,0 +1,351 @@
+import csv
+import json
+import os
+from collections import namedtuple
+
+# A text of the chatbot and its translations, shared by all the translation file formats
+# translations is a dictionary with the target language as key and the translation as value
+# new is the set of the target languages where the translation is new
+# review is a dictionary with the target languages where the translation is the one of a
+# similar text as key, and the similar text and its similarity (0 to 1) as value
+Record = namedtuple("Record", ["identifier", "original", "translations", "new", "review"], defaults=[{}])
+
+XLIFF_12_NAMESPACE = "urn:oasis:names:tc:xliff:document:1.2"
+XLIFF_20_NAMESPACE = "urn:oasis:names:tc:xliff:document:2.0"
+
+# File formats guessed from the file extensions
+EXTENSIONS = {
+    ".xlsx": "xlsx",
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".xlf": "xliff",
+    ".xliff": "xliff",
+}
+
+
+def translation_header(target=None):
+    # Files with a single target language have a single "Translation" column,
+    # files with several target languages have a "Translation <language>" column per language
+    if target:
+        return "Translation " + target
+    return "Translation"
+
+
+def status_header(target=None):
+    if target:
+        return "Status " + target
+    return "Status"
+
+
+def translation_status(record, target):
+    """Returns the status of a translation: empty, new, or review with the similar text"""
+    if target in record.review:
+        similar, similarity = record.review[target]
+        return f"review: translation of a similar text ({similarity:.0%}): {similar}"
+    if target in record.new:
+        return "new"
+    return ""
+
+
+def translation_column(header, target, targets):
+    """Returns the index of the translation column of a target language in a header row, or None.
+
+    The "Translation" column of the files with a single target language has
+    no language, it is only used when a single target language is requested.
+    """
+    if target and translation_header(target) in header:
+        return header.index(translation_header(target))
+    if len(targets) == 1 and translation_header() in header:
+        return header.index(translation_header())
+    return None
+
+
+def file_format(path, format="auto"):
+    """Returns the format of a translation file, guessed from its extension when format is auto"""
+    if format != "auto":
+        return format
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise Exception("Unknown translation file format for " + path)
+    return EXTENSIONS[extension]
+
+
+def write_translations(path, records, source, targets, format="auto"):
+    """Writes an iterable of records to a translation file"""
+    writer = FORMATS[file_format(path, format)][0]
+    writer(path, records, source, targets)
+
+
+def load_translations(path, targets, required=True, format="auto"):
+    """Loads the translations of several target languages from a translation file.
+
+    Returns a dictionary per target language, with the identifier as key and
+    a tuple (english, translation) as value. When the file has no translations
+    for a target language, an exception is raised, or an empty dictionary is
+    returned if required is False.
+    """
+    loader = FORMATS[file_format(path, format)][1]
+    return loader(path, targets, required)
+
+
+def missing_language(path, target, required):
+    if required:
+        raise Exception("No translations for " + str(target) + " found in " + path)
+
+
+# Excel
+
+
+def write_xlsx(path, records, source, targets):
+    # openpyxl is slow to import, only import it when needed
+    from write_translations_to_excel import write_translations_to_excel
+
+    write_translations_to_excel(path, records, targets)
+
+
+def load_xlsx(path, targets, required):
+    from load_translations_from_excel import load_all_translations_from_excel
+
+    return load_all_translations_from_excel(path, targets, required)
+
+
+# CSV, with the same columns as the excel files, followed by the status of the translations
+# as CSV files have no highlighting
+
+
+def write_csv(path, records, source, targets):
+    print("Writing CSV file...")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if len(targets) == 1:
+            writer.writerow(["Identifier", "Original English Text", translation_header(), status_header()])
+        else:
+            writer.writerow(
+                [
+                    "Identifier",
+                    "Original English Text",
+                    *[translation_header(target) for target in targets],
+                    *[status_header(target) for target in targets],
+                ]
+            )
+        for record in records:
+            writer.writerow(
+                [
+                    record.identifier,
+                    record.original,
+                    *[record.translations[target] for target in targets],
+                    *[translation_status(record, target) for target in targets],
+                ]
+            )
+    print("CSV file created: " + path)
+
+
+def load_csv(path, targets, required):
+    print("Load translations from CSV " + path)
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = csv.reader(f)
+        header = next(rows, [])
+        columns = dict()
+        for target in targets:
+            column = translation_column(header, target, targets)
+            if column is None:
+                missing_language(path, target, required)
+            else:
+                columns[target] = column
+
+        translations = {target: dict() for target in targets}
+        for row in rows:
+            if not any(row):
+                continue
+            for target, column in columns.items():
+                translation = row[column] if len(row) > column else None
+                translations[target][row[0]] = (row[1], translation)
+    return translations
+
+
+# JSON Lines, one record per line
+
+
+def write_jsonl(path, records, source, targets):
+    print("Writing JSONL file...")
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            line = {
+                "id": record.identifier,
+                "source": source,
+                "original": record.original,
+                "translations": {target: record.translations[target] for target in targets},
+                "new": [target for target in targets if target in record.new],
+                "review": {
+                    target: {"similar": similar, "similarity": round(similarity, 2)}
+                    for target, (similar, similarity) in record.review.items()
+                },
+            }
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    print("JSONL file created: " + path)
+
+
+def load_jsonl(path, targets, required):
+    print("Load translations from JSONL " + path)
+    translations = {target: dict() for target in targets}
+    found = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record_translations = record["translations"]
+            for target in targets:
+                # Without target language, the file must have a single language
+                if target is None and len(record_translations) == 1:
+                    translation = next(iter(record_translations.values()))
+                elif target in record_translations:
+                    translation = record_translations[target]
+                else:
+                    continue
+                found.add(target)
+                translations[target][record["id"]] = (record["original"], translation)
+    for target in targets:
+        if target not in found:
+            missing_language(path, target, required)
+    return translations
+
+
+# XLIFF 1.2, with a <file> per target language
+
+
+def write_xliff(path, records, source, targets):
+    # xml.sax imports urllib, only import it when needed
+    from xml.sax.saxutils import escape, quoteattr
+
+    print("Writing XLIFF 1.2 file...")
+    records = iter(records)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<xliff version="1.2" xmlns="%s">\n' % XLIFF_12_NAMESPACE)
+        # The records are streamed, every <file> gets its own pass when there are several languages
+        if len(targets) > 1:
+            records = list(records)
+        for target in targets:
+            f.write(
+                '  <file original="botpress" datatype="plaintext" source-language=%s target-language=%s>\n'
+                % (quoteattr(source), quoteattr(target))
+            )
+            f.write("    <body>\n")
+            for record in records:
+                if target in record.new or target in record.review:
+                    state = "needs-review-translation"
+                else:
+                    state = "translated"
+                # The translations of similar texts are fuzzy matches
+                qualifier = ' state-qualifier="fuzzy-match"' if target in record.review else ""
+                f.write("      <trans-unit id=%s>\n" % quoteattr(record.identifier))
+                f.write("        <source>%s</source>\n" % escape(record.original or ""))
+                f.write(
+                    "        <target state=%s%s>%s</target>\n"
+                    % (quoteattr(state), qualifier, escape(record.translations[target] or ""))
+                )
+                f.write("      </trans-unit>\n")
+            f.write("    </body>\n")
+            f.write("  </file>\n")
+        f.write("</xliff>\n")
+    print("XLIFF file created: " + path)
+
+
+def load_xliff(path, targets, required):
+    from xml.etree import ElementTree
+
+    # The .xlf and .xliff files can also be XLIFF 2.0 files, the version is the namespace of the root
+    with open(path, "rb") as f:
+        _, root = next(ElementTree.iterparse(f, events=("start",)))
+    if root.tag == "{%s}xliff" % XLIFF_20_NAMESPACE:
+        return load_xliff2(path, targets, required)
+
+    print("Load translations from XLIFF 1.2 " + path)
+    namespace = "{%s}" % XLIFF_12_NAMESPACE
+    translations = {target: dict() for target in targets}
+    found = set()
+    language = None
+    for event, element in ElementTree.iterparse(path, events=("start", "end")):
+        if event == "start" and element.tag == namespace + "file":
+            language = element.get("target-language")
+        elif event == "end" and element.tag == namespace + "trans-unit":
+            for target in targets:
+                if target == language or (target is None and len(targets) == 1):
+                    found.add(target)
+                    translations[target][element.get("id")] = (
+                        element.findtext(namespace + "source"),
+                        element.findtext(namespace + "target"),
+                    )
+            # Free the memory of the parsed units
+            element.clear()
+    for target in targets:
+        if target not in found:
+            missing_language(path, target, required)
+    return translations
+
+
+# XLIFF 2.0, that has a single target language per file
+
+
+def write_xliff2(path, records, source, targets):
+    from xml.sax.saxutils import escape, quoteattr
+
+    if len(targets) != 1:
+        raise Exception("XLIFF 2.0 files have a single target language, use XLIFF 1.2 for several languages")
+    target = targets[0]
+    print("Writing XLIFF 2.0 file...")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(
+            '<xliff xmlns="%s" version="2.0" srcLang=%s trgLang=%s>\n'
+            % (XLIFF_20_NAMESPACE, quoteattr(source), quoteattr(target))
+        )
+        f.write('  <file id="botpress">\n')
+        for index, record in enumerate(records):
+            state = "initial" if target in record.new or target in record.review else "translated"
+            # Unit ids must be NMTOKENs, the identifier is kept in the name
+            f.write('    <unit id="u%d" name=%s>\n' % (index + 1, quoteattr(record.identifier)))
+            f.write("      <segment state=%s>\n" % quoteattr(state))
+            f.write("        <source>%s</source>\n" % escape(record.original or ""))
+            f.write("        <target>%s</target>\n" % escape(record.translations[target] or ""))
+            f.write("      </segment>\n")
+            f.write("    </unit>\n")
+        f.write("  </file>\n")
+        f.write("</xliff>\n")
+    print("XLIFF file created: " + path)
+
+
+def load_xliff2(path, targets, required):
+    from xml.etree import ElementTree
+
+    print("Load translations from XLIFF 2.0 " + path)
+    namespace = "{%s}" % XLIFF_20_NAMESPACE
+    translations = {target: dict() for target in targets}
+    language = None
+    for event, element in ElementTree.iterparse(path, events=("start", "end")):
+        if event == "start" and element.tag == namespace + "xliff":
+            language = element.get("trgLang")
+        elif event == "end" and element.tag == namespace + "unit":
+            segment = element.find(namespace + "segment")
+            for target in targets:
+                if target == language or (target is None and len(targets) == 1):
+                    translations[target][element.get("name") or element.get("id")] = (
+                        segment.findtext(namespace + "source"),
+                        segment.findtext(namespace + "target"),
+                    )
+            element.clear()
+    for target in targets:
+        if target != language and not (target is None and len(targets) == 1):
+            missing_language(path, target, required)
+    return translations
+
+
+# Writer and loader of each format
+FORMATS = {
+    "xlsx": (write_xlsx, load_xlsx),
+    "csv": (write_csv, load_csv),
+    "jsonl": (write_jsonl, load_jsonl),
+    "xliff": (write_xliff, load_xliff),
+    "xliff2": (write_xliff2, load_xliff2),
+}
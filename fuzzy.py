@@ -0,0 +1,101 @@
+import bisect
+import math
+import re
+from collections import defaultdict
+
+# Texts are compared with the Dice coefficient of their character trigrams
+NGRAM_SIZE = 3
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize(text):
+    # Case, spaces and punctuation changes don't matter
+    return " ".join(PUNCTUATION.sub(" ", text.casefold()).split())
+
+
+def ngrams(text):
+    padded = " " + text + " "
+    return frozenset(padded[i : i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1))
+
+
+def similarity(a, b):
+    """Dice coefficient of two sets of n-grams, from 0 to 1"""
+    if not a and not b:
+        return 1.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class FuzzyIndex:
+    """Index of translated texts, to find the translation of the most similar text.
+
+    The texts are indexed by their character trigrams. A lookup only reads
+    the postings of the rarest trigrams of the text, as a text similar enough
+    must share at least one of them, and only the part of the postings with
+    a compatible number of trigrams. This keeps the lookups fast with tens of
+    thousands of texts.
+    """
+
+    def __init__(self, translations):
+        # translations is a dictionary with the text as key and its translation as value
+        normalized_texts = dict()
+        for text, translation in translations.items():
+            if not text or translation is None:
+                continue
+            normalized = normalize(text)
+            # Texts made of punctuation or emojis only are not similar to anything
+            if not normalized:
+                continue
+            # Texts with the same normalized form are indexed once
+            normalized_texts.setdefault(normalized, (text, translation))
+
+        # The entries are sorted by number of trigrams, so the postings are sorted too
+        self.entries = sorted(
+            ((text, translation, ngrams(normalized)) for normalized, (text, translation) in normalized_texts.items()),
+            key=lambda entry: len(entry[2]),
+        )
+        self.exact = {normalize(text): index for index, (text, _, _) in enumerate(self.entries)}
+
+        # The postings have the numbers of trigrams of the entries next to them
+        postings = defaultdict(lambda: ([], []))
+        for index, (_, _, grams) in enumerate(self.entries):
+            for gram in grams:
+                indices, sizes = postings[gram]
+                indices.append(index)
+                sizes.append(len(grams))
+        self.postings = dict(postings)
+
+    def lookup(self, text, threshold):
+        """Returns (text, translation, similarity) of the most similar text, or None below the threshold"""
+        normalized = normalize(text)
+        if not normalized:
+            return None
+        if normalized in self.exact:
+            matched_text, translation, _ = self.entries[self.exact[normalized]]
+            return matched_text, translation, 1.0
+
+        grams = ngrams(normalized)
+        # The similarity is too low when the numbers of trigrams are too different
+        minimum_size = threshold * len(grams) / (2 - threshold)
+        maximum_size = (2 - threshold) * len(grams) / threshold
+
+        # A text with a similarity above the threshold shares at least minimum_size trigrams,
+        # so it has at least one of the len(grams) - minimum_size + 1 rarest trigrams
+        rarest = sorted(
+            grams, key=lambda gram: len(self.postings[gram][0]) if gram in self.postings else 0
+        )
+        candidates = set()
+        for gram in rarest[: len(grams) - math.ceil(minimum_size) + 1]:
+            if gram not in self.postings:
+                continue
+            indices, sizes = self.postings[gram]
+            start = bisect.bisect_left(sizes, minimum_size)
+            end = bisect.bisect_right(sizes, maximum_size)
+            candidates.update(indices[start:end])
+
+        best = None
+        for index in sorted(candidates):
+            candidate_text, translation, candidate_grams = self.entries[index]
+            score = similarity(grams, candidate_grams)
+            if score >= threshold and (best is None or score > best[2]):
+                best = (candidate_text, translation, score)
+        return best
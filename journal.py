@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+
+from metrics import metrics
+
+
+def journal_path(translation_path):
+    # The journal is saved next to the translation file, until the translation file is written
+    return translation_path + ".journal.jsonl"
+
+
+class Journal:
+    """Journal of the translations received during an extraction.
+
+    Every translated batch is appended to the journal as soon as it is
+    received, one JSON object per line. When an extraction fails (quota,
+    network...), the next extraction with resume reuses the translations of
+    the journal instead of translating them again. The journal is removed
+    once the translation file is written. The journal can be shared between threads.
+
+    options (the backend, the masking of the placeholders...) are saved with
+    every batch, only the batches translated with the same options are reused.
+    Without resume, an existing journal is kept under another name.
+    """
+
+    def __init__(self, path, resume=False, options=None):
+        self.path = path
+        self.options = options or dict()
+        self.lock = threading.Lock()
+        # Translations per (source, target), with the text as key and the translation as value
+        self.translations = dict()
+        if os.path.exists(path):
+            if resume:
+                self.load()
+                print(f"Resuming from {path} with {sum(len(t) for t in self.translations.values())} translations")
+            else:
+                self.rotate()
+        self.file = open(path, "a", encoding="utf-8")
+
+    def rotate(self):
+        # Never lose the translations of an interrupted extraction
+        index = 1
+        while os.path.exists(f"{self.path}.{index}"):
+            index += 1
+        os.rename(self.path, f"{self.path}.{index}")
+        print(
+            f"Warning: the journal of an interrupted extraction was moved to {self.path}.{index}, "
+            f"rename it to {self.path} and use --resume=true to reuse its translations"
+        )
+
+    def load(self):
+        ignored = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    # The last line is incomplete when the extraction was killed while writing it
+                    continue
+                if batch.get("options") != self.options:
+                    ignored += 1
+                    continue
+                key = (batch["source"], batch["target"])
+                self.translations.setdefault(key, dict()).update(batch["translations"])
+        if ignored:
+            print(f"{ignored} batches of {self.path} translated with other options are not reused")
+
+    def lookup(self, texts, source, target):
+        """Returns a dictionary with the texts found in the journal as key and their translation as value"""
+        with self.lock:
+            translations = self.translations.get((source, target), dict())
+            found = {text: translations[text] for text in texts if text in translations}
+        metrics.count("journal hits", len(found))
+        return found
+
+    def add(self, translations, source, target):
+        """Appends a dictionary of translations (text as key, translation as value) to the journal"""
+        line = json.dumps(
+            {"source": source, "target": target, "options": self.options, "translations": translations},
+            ensure_ascii=False,
+        )
+        with self.lock:
+            self.translations.setdefault((source, target), dict()).update(translations)
+            self.file.write(line + "\n")
+            # Flushed at every batch, so a crash loses at most the batches in flight
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def remove(self):
+        """Removes the journal, once the translations are saved in the translation file"""
+        self.close()
+        os.remove(self.path)
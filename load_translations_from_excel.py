@@ -1,17 +1,66 @@
 import openpyxl
 
-def load_translations_from_excel(excel_path):
+from formats import missing_language, translation_column
+
+# The empty rows are skipped, after this many empty rows in a row there is nothing left to read
+# (formatted but empty rows can go on until the end of the sheet)
+MAX_EMPTY_ROWS = 1000
+
+
+def load_translations_from_excel(excel_path, target=None, required=True):
+    """Loads the translations of the target language from an excel file.
+
+    When the file has no translations for the target language, an exception
+    is raised, or an empty dictionary is returned if required is False.
+    """
+    return load_all_translations_from_excel(excel_path, [target], required)[target]
+
+
+def load_all_translations_from_excel(excel_path, targets, required=True):
+    """Loads the translations of several target languages from an excel file in a single pass.
+
+    Returns a dictionary per target language, see load_translations_from_excel.
+    The workbook is read in read-only mode, row by row, so large files don't
+    need to be loaded in memory. Columns after the translations are ignored.
+    """
     print("Load previous  from excel " + excel_path)
-    wb = openpyxl.load_workbook(excel_path)
-    ws = wb.active
+    wb = openpyxl.load_workbook(excel_path, read_only=True)
+    try:
+        ws = wb.active
+        # The dimensions saved in the file may be wrong, read until the last row instead
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+
+        # Find the translation column of each target language
+        header = next(rows, ())
+        columns = dict()
+        for target in targets:
+            column = translation_column(header, target, targets)
+            if column is None:
+                missing_language(excel_path, target, required)
+            else:
+                columns[target] = column
 
-    # Create a dictionary of translations, the key is the path
-    # The value is a tuple that contains the english and the translation
-    translations=dict()
+        # Create a dictionary of translations per language, the key is the path
+        # The value is a tuple that contains the english and the translation
+        translations = {target: dict() for target in targets}
 
-    # Build the dictionary
-    for row in list(ws.rows)[1:]:
-        [ path, english, translation ] = [ cell.value for cell in row ]
-        translations[path] = (english, translation)
+        # Build the dictionaries
+        empty_rows = 0
+        for row in rows:
+            if not any(value is not None for value in row):
+                empty_rows += 1
+                if empty_rows >= MAX_EMPTY_ROWS:
+                    break
+                continue
+            empty_rows = 0
+            path = row[0]
+            english = row[1] if len(row) > 1 else None
+            for target, column in columns.items():
+                translation = row[column] if len(row) > column else None
+                translations[target][path] = (english, translation)
+    finally:
+        # Read-only workbooks keep the file open until they are closed
+        wb.close()
 
-    return translations
\ No newline at end of file
+    return translations
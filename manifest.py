@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+
+# Version of the manifest files, increased when the hashes change
+MANIFEST_VERSION = 1
+
+
+def manifest_path(translation_path):
+    # The manifest is saved next to the translation file
+    return translation_path + ".manifest.json"
+
+
+def element_hashes(elements):
+    """Returns the content hash of every element, elements is a dictionary of lists of (identifier, text)"""
+    return {
+        key: hashlib.sha1(
+            json.dumps(entries, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        for key, entries in elements.items()
+    }
+
+
+def write_manifest(path, hashes):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "elements": hashes}, f, indent=2, ensure_ascii=False)
+
+
+def load_manifest(path):
+    """Returns the element hashes of a manifest, or None if there is no usable manifest"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest["elements"]
+
+
+def compare_manifests(previous_hashes, hashes):
+    """Returns the sets of the unchanged, changed, added and removed elements"""
+    unchanged = set()
+    changed = set()
+    added = set()
+    for key, hash in hashes.items():
+        if key not in previous_hashes:
+            added.add(key)
+        elif previous_hashes[key] == hash:
+            unchanged.add(key)
+        else:
+            changed.add(key)
+    removed = set(previous_hashes) - set(hashes)
+    return unchanged, changed, added, removed
@@ -0,0 +1,67 @@
+import cProfile
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Timers and counters of the stages of an extraction or a packing.
+
+    The same stage can be timed several times, the durations are added.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.timers = dict()
+            self.counters = dict()
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.timers[stage] = self.timers.get(stage, 0) + elapsed
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        with self.lock:
+            return {
+                "timers": {stage: round(seconds, 6) for stage, seconds in self.timers.items()},
+                "counters": dict(self.counters),
+            }
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        print("Metrics written to " + path)
+
+
+# Metrics of the current process
+metrics = Metrics()
+
+
+@contextmanager
+def profile(path):
+    """Profiles the code of the block with cProfile and saves the statistics to path, if path is set"""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print("Profile written to " + path)
@@ -1,190 +1,302 @@
-import json
-import tarfile
-import tempfile
 import os
-from load_translations_from_excel import load_translations_from_excel
 
-def pack(bot_path, excel_path, new_path):
-    translations = load_translations_from_excel(excel_path)
-
-    def get_translation(path, expected_existing_english):
-        if not path in translations:
-            raise Exception("No translation found for " + str(path)) 
-        (english, translation) = translations[path]
-        if expected_existing_english and english != expected_existing_english:
-            raise Exception("Expected " + str(expected_existing_english) + " but found " + str(english))
-        
-        return translation
+import fastjson
+from formats import load_translations
+from archive import read_members, write_archive
+from schema import SCHEMA, load_document, sort_members, walk
+from metrics import metrics
+
+BOT_CONFIG = "bot.config.json"
+# The schema describes where the english texts are, see schema.py
+SOURCE_LANGUAGE = "en"
+
+
+def language_path(new_path, target):
+    # new.tgz becomes new_fr.tgz, unless the path contains a {lang} placeholder
+    if "{lang}" in new_path:
+        return new_path.replace("{lang}", target)
+    root, extension = os.path.splitext(new_path)
+    return root + "_" + target + extension
+
+
+def pack(
+    bot_path,
+    excel_path,
+    new_path,
+    targets=None,
+    format="auto",
+    compression_level=9,
+    compression_threads=1,
+    dry_run=False,
+    json_style="compat",
+    multilingual=False,
+):
+    # A single target language can be given as a string, and several translation files as a list
+    if isinstance(targets, str):
+        targets = [targets]
+    if multilingual and not targets:
+        raise Exception("The target languages are required to pack a multilingual bot")
 
     print("Patching the bot " + bot_path)
-    # Extract the bot to a temporary directory
-    with tempfile.TemporaryDirectory() as temporary_directory:
-        # Extract the .tgz file in python
-        with tarfile.open(bot_path, "r:gz") as tar:
-            tar.extractall(temporary_directory)
-
-        # Open content-elements/builtin_text.json
-        with open(
-            temporary_directory + "/content-elements/builtin_text.json", "r"
-        ) as f:
-            # read and parse json
-            builtin_texts = json.load(f)
-            # builtin_text is an array of objects containing an id and a formData object
-            for builtin_text in builtin_texts:
-                translation = get_translation(builtin_text["id"], builtin_text["formData"]["text$en"])
-                # We keep the $en field because it seems that our version of botpress
-                # does not support other languages
-                builtin_text["formData"]["text$en"] = translation
-
-            translated_builtin_texts = json.dumps(builtin_texts, indent=2, ensure_ascii=False)
-
-        with open(
-            temporary_directory + "/content-elements/builtin_text.json", "w"
-        ) as f:
-            f.write(translated_builtin_texts)
-
-        # Open content-elements/builtin_card.json
-        with open(
-            temporary_directory + "/content-elements/builtin_card.json", "r"
-        ) as f:
-            # read and parse json
-            builtin_cards = json.load(f)
-            # builtin_card is an array of objects containing an id and a formData object
-            for builtin_card in builtin_cards:
-
-                translation = get_translation(builtin_card["id"]+".title", builtin_card["formData"]["title$en"])
-                builtin_card["formData"]["title$en"] = translation
-
-                if "subtitle$en" in builtin_card["formData"]:
-                    translation = get_translation(builtin_card["id"]+".subtitle", builtin_card["formData"]["subtitle$en"])
-                    builtin_card["formData"]["subtitle$en"] = translation
-
-                for index, option in enumerate(builtin_card["formData"]["actions$en"]):
-                    translation = get_translation(builtin_card["id"] + ".actionTitle[" + str(index) + "]", option["title"])
-                    builtin_card["formData"]["actions$en"][index]["title"] = translation
-                    if "text" in option:
-                        translation = get_translation(builtin_card["id"] + ".actionText[" + str(index) + "]", option["text"])
-                        builtin_card["formData"]["actions$en"][index]["text"] = translation
-
-            translated_builtin_cards = json.dumps(builtin_cards, indent=2, ensure_ascii=False)
-        
-        with open(
-            temporary_directory + "/content-elements/builtin_card.json", "w"
-        ) as f:
-            f.write(translated_builtin_cards)
-
-        # Open content-elements/builtin_carousel.json
-        with open(
-            temporary_directory + "/content-elements/builtin_carousel.json", "r"
-        ) as f:
-            # read and parse json
-            builtin_carousels = json.load(f)
-            # builtin_carousel is an array of objects containing an id and a formData object
-            for builtin_carousel in builtin_carousels:
-                for index, option in enumerate(builtin_carousel["formData"]["items$en"]):
-                    translation = get_translation(builtin_carousel["id"] + ".itemTitle[" + str(index) + "]", option["title"])
-                    builtin_carousel["formData"]["items$en"][index]["title"] = translation
-                    for actionIndex, option in enumerate(option["actions"]):
-                        translation = get_translation(builtin_carousel["id"] + ".itemActionTitle[" + str(index) + "][" + str(actionIndex) + "]", option["title"])
-                        builtin_carousel["formData"]["items$en"][index]["actions"][actionIndex]["title"] = translation
-
-            translated_builtin_carousels = json.dumps(builtin_carousels, indent=2, ensure_ascii=False)
-
-        with open(
-            temporary_directory + "/content-elements/builtin_carousel.json", "w"
-        ) as f:
-            f.write(translated_builtin_carousels)
-
-        # Open content-elements/builtin_image.json
-        with open(
-            temporary_directory + "/content-elements/builtin_image.json", "r"
-        ) as f:
-            # read and parse json
-            builtin_images = json.load(f)
-            # builtin_image is an array of objects containing an id and a formData object
-            for builtin_image in builtin_images:
-                if "title$en" in builtin_image["formData"]:
-                    translation = get_translation(builtin_image["id"]+".title", builtin_image["formData"]["title$en"])
-                    builtin_image["formData"]["title$en"] = translation
-
-            translated_builtin_images = json.dumps(builtin_images, indent=2, ensure_ascii=False)
-
-        with open(
-            temporary_directory + "/content-elements/builtin_image.json", "w"
-        ) as f:
-            f.write(translated_builtin_images)
-
-        # Open content-elements/builtin_single-choice.json
-        with open(
-            temporary_directory + "/content-elements/builtin_single-choice.json", "r"
-        ) as f:
-            # read and parse json
-            builtin_single_choices = json.load(f)
-            # builtin_single_choice is an array of objects containing an id and a formData object
-            for builtin_single_choice in builtin_single_choices:
-                translation = get_translation(builtin_single_choice["id"]+".dropdown", builtin_single_choice["formData"]["dropdownPlaceholder$en"])
-                builtin_single_choice["formData"]["dropdownPlaceholder$en"] = translation
-
-                if "text$en" in builtin_single_choice["formData"]:
-                    translation = get_translation(builtin_single_choice["id"]+".text", builtin_single_choice["formData"]["text$en"])
-                    builtin_single_choice["formData"]["text$en"] = translation
-
-                for index, option in enumerate(builtin_single_choice["formData"]["choices$en"]):
-                    translation = get_translation(builtin_single_choice["id"] + ".choice[" + str(index) + "]", option["title"])
-                    builtin_single_choice["formData"]["choices$en"][index]["title"] = translation
-
-            translated_builtin_single_choices = json.dumps(builtin_single_choices, indent=2, ensure_ascii=False)
-
-        with open(
-            temporary_directory + "/content-elements/builtin_single-choice.json", "w"
-        ) as f:
-            f.write(translated_builtin_single_choices)
-
-        # Open content-elements/dropdown.json
-        with open(
-            temporary_directory + "/content-elements/dropdown.json", "r"
-        ) as f:
-            # read and parse json
-            dropdowns = json.load(f)
-            # dropdown is an array of objects containing an id and a formData object
-            for dropdown in dropdowns:
-                translation = get_translation(dropdown["id"]+".message", dropdown["formData"]["message$en"])
-                dropdown["formData"]["message$en"] = translation
-
-                translation = get_translation(dropdown["id"]+".placeholderText", dropdown["formData"]["placeholderText$en"])
-                dropdown["formData"]["placeholderText$en"] = translation
-
-                for index, option in enumerate(dropdown["formData"]["options$en"]):
-                    translation = get_translation(dropdown["id"] + ".option[" + str(index) + "]", option["label"])
-                    dropdown["formData"]["options$en"][index]["label"] = translation
-
-            translated_dropdowns = json.dumps(dropdowns, indent=2, ensure_ascii=False)
-
-        with open(
-            temporary_directory + "/content-elements/dropdown.json", "w"
-        ) as f:
-            f.write(translated_dropdowns)
-
-        # This is disabled as translations are not available in our botpress version
-        # # Open bot.config.json
-        # with open(
-        #     temporary_directory + "/bot.config.json", "r"
-        # ) as f:
-        #     # read and parse json
-        #     bot_config = json.load(f)
-        #     bot_config["languages"] = ["no", "en", "fr"]
-        #     bot_config["defaultLanguage"] = "no"
-
-        #     translated_bot_config = json.dumps(bot_config, indent=2, ensure_ascii=False)
-
-        # with open(
-        #     temporary_directory + "/bot.config.json", "w"
-        # ) as f:
-        #     f.write(translated_bot_config)
-
-        print("Writing the new bot to " + new_path)
-        # Create a .tgz file of the temporary directory
-        with tarfile.open(new_path, "w:gz") as tar:
-            for name in os.listdir(temporary_directory):
-                tar.add(temporary_directory + "/" + name, arcname=name)
-
+    # Read the content elements directly from the archive, once for all the languages
+    contents = read_members(bot_path, [*SCHEMA.keys(), BOT_CONFIG])
+    bot_config = contents.pop(BOT_CONFIG, None)
+
+    # Without target languages, the translation file has a single translation column
+    with metrics.timer("load translations"):
+        all_translations = load_all_translations(excel_path, targets, format)
+
+    # Check all the languages before writing anything, and report all the problems at once
+    with metrics.timer("validate"):
+        expected, added = expected_texts(contents)
+        errors = 0
+        for target, translations in all_translations.items():
+            errors += report_problems(target, *validate(expected, translations, added))
+    if errors:
+        excel_paths = excel_path if isinstance(excel_path, str) else ", ".join(excel_path)
+        raise Exception(str(errors) + " translations are missing or stale in " + excel_paths)
+    if dry_run:
+        print("The translations are valid, no bot written (dry run)")
+        return
+
+    if multilingual:
+        pack_multilingual(
+            bot_path,
+            contents,
+            bot_config,
+            all_translations,
+            new_path,
+            compression_level,
+            compression_threads,
+            json_style,
+            added,
+        )
+        return
+
+    for target, translations in all_translations.items():
+        if targets and len(targets) > 1:
+            target_path = language_path(new_path, target)
+        else:
+            target_path = new_path
+        pack_language(
+            bot_path,
+            contents,
+            translations,
+            target_path,
+            compression_level,
+            compression_threads,
+            json_style,
+            added,
+        )
+
+
+def load_all_translations(excel_paths, targets, format="auto"):
+    """Loads the translations of the target languages from one or several translation files.
+
+    When there are as many files as target languages, each file has the
+    translations of a language, in the same order, unless the file names its
+    languages. Otherwise, the translations of a language are taken from the
+    first file that has them.
+    """
+    if isinstance(excel_paths, str):
+        return load_translations(excel_paths, targets or [None], format=format)
+    if len(excel_paths) == len(targets or [None]):
+        all_translations = dict()
+        for excel_path, target in zip(excel_paths, targets or [None]):
+            if len(targets or [None]) > 1:
+                # A file with the translations of other languages is not used for this language
+                named = load_translations(excel_path, targets, required=False, format=format)
+                if named[target]:
+                    all_translations[target] = named[target]
+                    continue
+                if any(named.values()):
+                    raise Exception(
+                        "No translations for " + str(target) + " found in " + excel_path
+                        + ", the files must be in the order of the target languages"
+                    )
+            all_translations.update(load_translations(excel_path, [target], format=format))
+        return all_translations
+
+    all_translations = {target: dict() for target in targets or [None]}
+    for excel_path in excel_paths:
+        missing = [target for target, translations in all_translations.items() if not translations]
+        loaded = load_translations(excel_path, missing, required=False, format=format)
+        for target, translations in loaded.items():
+            all_translations[target] = translations
+    for target, translations in all_translations.items():
+        if not translations:
+            raise Exception("No translations for " + str(target) + " found in " + ", ".join(excel_paths))
+    return all_translations
+
+
+def expected_texts(contents):
+    """Returns a dictionary with the identifiers of all the texts of the bot as key and the text as value.
+
+    Also returns the set of the identifiers of the added texts, see schema.py.
+    """
+    expected = dict()
+    added = set()
+    for name in sort_members(contents):
+        for identifier, container, key, is_added in walk(name, load_document(name, contents[name]), True):
+            expected[identifier] = container[key]
+            if is_added:
+                added.add(identifier)
+    return expected, added
+
+
+def validate(expected, translations, added=()):
+    """Compares the texts of the bot with the rows of a translation file.
+
+    Returns the sorted lists of the missing identifiers (texts without
+    translation, or with an empty translation), of the stale rows (identifier, bot text, text of the row)
+    whose original text changed in the bot, of the orphaned identifiers
+    (rows without text in the bot), and of the untranslated identifiers
+    (added texts without translation, packed as they are, see schema.py).
+    Only the files without any row for the added texts were extracted by
+    older versions, the added texts without row of the other files are missing.
+    """
+    missing = []
+    stale = []
+    untranslated = []
+    older_file = not any(identifier in translations for identifier in added)
+    for identifier, text in expected.items():
+        if identifier not in translations:
+            if older_file and identifier in added:
+                untranslated.append(identifier)
+            else:
+                missing.append(identifier)
+            continue
+        english, translation = translations[identifier]
+        # An empty cell would replace the text of the bot by null or nothing
+        if text and not translation:
+            missing.append(identifier)
+            continue
+        if text and english != text:
+            stale.append((identifier, text, english))
+    orphaned = [identifier for identifier in translations if identifier not in expected]
+    return sorted(missing), sorted(stale), sorted(orphaned), sorted(untranslated)
+
+
+def report_problems(target, missing, stale, orphaned, untranslated=()):
+    """Prints the problems of the translations of a language, returns the number of errors"""
+    language = " for " + target if target else ""
+    # The translation files extracted by older versions have no rows for the added texts
+    if untranslated:
+        print(
+            "Warning: %d texts%s have no translation and are kept untranslated, extract the translation file again to translate them"
+            % (len(untranslated), language)
+        )
+    for identifier in missing:
+        print("Missing translation" + language + ": " + identifier)
+    for identifier, text, english in stale:
+        print(
+            "Stale translation%s: %s, expected %r but found %r" % (language, identifier, text, english)
+        )
+    # Rows of removed texts are ignored, they don't prevent packing
+    for identifier in orphaned:
+        print("Orphaned translation" + language + " (ignored): " + identifier)
+    if missing or stale or orphaned:
+        print(
+            "%d missing, %d stale and %d orphaned translations%s"
+            % (len(missing), len(stale), len(orphaned), language)
+        )
+    return len(missing) + len(stale)
+
+
+def get_translation(translations, path, expected_existing_english):
+    if not path in translations:
+        raise Exception("No translation found for " + str(path))
+    (english, translation) = translations[path]
+    if expected_existing_english and english != expected_existing_english:
+        raise Exception("Expected " + str(expected_existing_english) + " but found " + str(english))
+
+    return translation
+
+
+def pack_language(
+    bot_path,
+    contents,
+    translations,
+    new_path,
+    compression_level=9,
+    compression_threads=1,
+    json_style="compat",
+    added=(),
+):
+    def patch_file(name):
+        document = fastjson.loads(contents[name])
+        for identifier, container, key in walk(name, document):
+            # The added texts without translation are kept as they are
+            if identifier in added and identifier not in translations:
+                continue
+            # We keep the $en fields because it seems that our version of botpress
+            # does not support other languages
+            container[key] = get_translation(translations, identifier, container[key])
+            metrics.count("strings patched")
+        return name, fastjson.dumps(document, json_style)
+
+    # The patched files, every other file is copied from the original archive
+    with metrics.timer("patch json"):
+        replacements = dict(patch_file(name) for name in sort_members(contents))
+
+    print("Writing the new bot to " + new_path)
+    write_archive(bot_path, new_path, replacements, compression_level, compression_threads)
+
+
+def pack_multilingual(
+    bot_path,
+    contents,
+    bot_config,
+    all_translations,
+    new_path,
+    compression_level=9,
+    compression_threads=1,
+    json_style="compat",
+    added=(),
+):
+    """Writes a single bot with the texts of all the target languages next to the english ones.
+
+    The translations are written to text$fr fields, or to the fr key of the
+    objects with a key per language (the utterances of the intents), and
+    the target languages are added to the languages of bot.config.json.
+    """
+
+    def patch_file(name):
+        document = fastjson.loads(contents[name])
+        for target, translations in all_translations.items():
+            # The english texts are translated in a copy, then copied to the fields of the language
+            translated = fastjson.loads(contents[name])
+            for identifier, container, key in walk(name, translated):
+                if identifier in added and identifier not in translations:
+                    continue
+                container[key] = get_translation(translations, identifier, container[key])
+                metrics.count("strings patched")
+            add_language(document, translated, target)
+        return name, fastjson.dumps(document, json_style)
+
+    with metrics.timer("patch json"):
+        replacements = dict(patch_file(name) for name in sort_members(contents))
+
+    if bot_config is not None:
+        config = fastjson.loads(bot_config)
+        config["languages"] = list(dict.fromkeys([*config.get("languages", []), *all_translations]))
+        replacements[BOT_CONFIG] = fastjson.dumps(config, json_style)
+        print("Languages of the new bot: " + ", ".join(config["languages"]))
+
+    print("Writing the new bot to " + new_path)
+    write_archive(bot_path, new_path, replacements, compression_level, compression_threads)
+
+
+def add_language(original, translated, target):
+    """Copies the english fields of translated to the target language fields of original"""
+    if isinstance(translated, dict):
+        for key, value in translated.items():
+            if key.endswith("$" + SOURCE_LANGUAGE):
+                original[key[: -len(SOURCE_LANGUAGE)] + target] = value
+            elif key == SOURCE_LANGUAGE:
+                original[target] = value
+            else:
+                add_language(original[key], value, target)
+    elif isinstance(translated, list):
+        for original_item, translated_item in zip(original, translated):
+            add_language(original_item, translated_item, target)
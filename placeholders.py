@@ -0,0 +1,53 @@
+import re
+
+# Parts of the texts that must not be translated:
+# botpress template variables ({{event.payload.text}} and {{{raw}}}), inline code, URLs
+# and the slot annotations of the intent utterances ([Paris](city))
+PLACEHOLDER_PATTERN = re.compile(
+    r"\{\{\{.*?\}\}\}"
+    r"|\{\{.*?\}\}"
+    r"|`[^`\n]+`"
+    r"|\b(?:https?://|www\.)[^\s<>()\[\]]*[^\s<>()\[\].,;:!?'\"]"
+    r"|\[[^\[\]\n]+\]\([\w-]+\)"
+)
+
+# The placeholders are replaced by tags, that translation engines keep as they are
+TOKEN_FORMAT = '<x id="%d"/>'
+# Translation engines may change the spaces and quotes of the tags
+TOKEN_PATTERN = re.compile(r"<\s*x\s+id\s*=\s*[\"']?(\d+)[\"']?\s*/?>(?:\s*</x>)?")
+
+
+def mask(text):
+    """Replaces the placeholders of a text by numbered tokens.
+
+    Returns the template and the list of the placeholders, so texts that only
+    differ by their placeholders have the same template.
+    """
+    values = []
+
+    def replace(match):
+        values.append(match.group(0))
+        return TOKEN_FORMAT % (len(values) - 1)
+
+    return PLACEHOLDER_PATTERN.sub(replace, text), values
+
+
+def unmask(template, values):
+    """Replaces the tokens of a translated template by the placeholders"""
+    if template is None:
+        return None
+    restored = set()
+
+    def replace(match):
+        index = int(match.group(1))
+        if index >= len(values):
+            return match.group(0)
+        restored.add(index)
+        return values[index]
+
+    text = TOKEN_PATTERN.sub(replace, template)
+    # Never lose a placeholder, even if the translation engine dropped its token
+    missing = [value for index, value in enumerate(values) if index not in restored]
+    if missing:
+        text = " ".join([text, *missing])
+    return text
@@ -0,0 +1,62 @@
+import sys
+import threading
+import time
+from datetime import timedelta
+
+
+def format_duration(seconds):
+    return str(timedelta(seconds=round(seconds)))
+
+
+class Progress:
+    """Progress of a long stage, printed with the estimated remaining time.
+
+    The progress is updated from several threads with the amount of work
+    done (texts, characters...). On a terminal the line is rewritten in place
+    every interval seconds, otherwise a line is printed every log_interval seconds.
+    """
+
+    def __init__(self, stage, total, unit="characters", interval=0.5, log_interval=10, stream=None):
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.stream = stream or sys.stderr
+        self.interactive = self.stream.isatty()
+        self.interval = interval if self.interactive else log_interval
+        self.done = 0
+        self.start = time.monotonic()
+        self.printed = self.start
+        self.lock = threading.Lock()
+
+    def update(self, amount):
+        with self.lock:
+            self.done += amount
+            now = time.monotonic()
+            if now - self.printed >= self.interval:
+                self.printed = now
+                self.print(now)
+
+    def message(self, now):
+        elapsed = now - self.start
+        message = f"{self.stage}: {self.done}/{self.total} {self.unit}"
+        if self.total:
+            message += f" ({self.done / self.total:.0%})"
+        message += f", {format_duration(elapsed)} elapsed"
+        if 0 < self.done < self.total:
+            message += f", about {format_duration(elapsed / self.done * (self.total - self.done))} remaining"
+        return message
+
+    def print(self, now):
+        if self.interactive:
+            # Pad the line to erase a longer previous line
+            self.stream.write("\r" + self.message(now).ljust(79))
+        else:
+            self.stream.write(self.message(now) + "\n")
+        self.stream.flush()
+
+    def finish(self):
+        with self.lock:
+            self.print(time.monotonic())
+            if self.interactive:
+                self.stream.write("\n")
+                self.stream.flush()
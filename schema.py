@@ -0,0 +1,309 @@
+# Declarative description of the translatable texts of a botpress chatbot
+#
+# Every file of the schema is made of elements (content elements, flow
+# nodes, intents...) with an id. The fields describe where the texts are in
+# each element:
+#   Text(identifier, key): the text is container[key], its identifier in the
+#     translation file is the id of the element followed by identifier
+#   TextList(identifier, key): container[key] is a list of texts, the index
+#     of each text is used to format its identifier
+#   Each(key, fields): container[key] is a list, and fields are looked up in
+#     each item of the list. The index of the item is used to format the
+#     identifiers of the nested texts.
+#   Nested(key, fields): container[key] is an object, and fields are looked up in it
+#   Content(key): container[key] is an inline content element with a
+#     contentType and a formData, the fields of its content type are looked
+#     up in the formData
+#
+# The texts marked as added (fields and sources) were not translated by the
+# first versions of the translator: the translation files extracted by these
+# versions have no rows for them, and they are then packed untranslated.
+
+import fnmatch
+
+import fastjson
+
+
+class Text:
+    def __init__(self, identifier, key, optional=False, added=False):
+        self.identifier = identifier
+        self.key = key
+        # Optional texts may be missing from the formData
+        self.optional = optional
+        self.added = added
+
+
+class TextList:
+    def __init__(self, identifier, key, optional=False, added=False):
+        self.identifier = identifier
+        self.key = key
+        self.optional = optional
+        self.added = added
+
+
+class Each:
+    def __init__(self, key, fields):
+        self.key = key
+        self.fields = fields
+
+
+class Nested:
+    def __init__(self, key, fields, optional=False):
+        self.key = key
+        self.fields = fields
+        self.optional = optional
+
+
+class Content:
+    def __init__(self, key):
+        self.key = key
+
+
+class Source:
+    """A kind of file of the chatbot containing texts.
+
+    elements(name, document) yields the (id, container) of the elements of a
+    file, the fields are looked up in the containers. array is True when the
+    document is a JSON array whose items can be parsed one by one. added is
+    True when all the texts of the source are added, see above.
+    """
+
+    def __init__(self, elements, fields, array=False, added=False):
+        self.elements = elements
+        self.fields = fields
+        self.array = array
+        self.added = added
+
+
+def content_elements(name, elements):
+    for element in elements:
+        yield element["id"], element["formData"]
+
+
+def flow_nodes(name, flow):
+    # flows/main.flow.json contains the nodes of the main flow, the id of a node is only unique in its flow
+    flow_name = name[len("flows/") : -len(".flow.json")]
+    for node in flow.get("nodes", []):
+        yield "flow:" + flow_name + "/" + node["id"], node
+
+
+def intent(name, intent):
+    yield "intent:" + intent["name"], intent
+
+
+def qna(name, qna):
+    yield "qna:" + qna["id"], qna["data"]
+
+
+# The fields of the formData of each content type
+CONTENT_TYPES = {
+    "builtin_text": [
+        Text("", "text$en"),
+        TextList(".variation[{}]", "variations$en", optional=True, added=True),
+    ],
+    "builtin_card": [
+        Text(".title", "title$en"),
+        Text(".subtitle", "subtitle$en", optional=True),
+        Each(
+            "actions$en",
+            [
+                Text(".actionTitle[{}]", "title"),
+                Text(".actionText[{}]", "text", optional=True),
+            ],
+        ),
+    ],
+    "builtin_carousel": [
+        Each(
+            "items$en",
+            [
+                Text(".itemTitle[{}]", "title"),
+                Each("actions", [Text(".itemActionTitle[{}][{}]", "title")]),
+            ],
+        ),
+    ],
+    "builtin_image": [
+        Text(".title", "title$en", optional=True),
+    ],
+    "builtin_single-choice": [
+        Text(".dropdown", "dropdownPlaceholder$en"),
+        Text(".text", "text$en", optional=True),
+        Each("choices$en", [Text(".choice[{}]", "title")]),
+    ],
+    "dropdown": [
+        Text(".message", "message$en"),
+        Text(".placeholderText", "placeholderText$en"),
+        Each("options$en", [Text(".option[{}]", "label")]),
+    ],
+    # The videos most likely need to be changed by hand, only their titles are translated
+    "builtin_video": [
+        Text(".title", "title$en", optional=True),
+    ],
+    "builtin_action-button": [
+        Text(".title", "title$en"),
+    ],
+    "builtin_location": [
+        Text(".title", "title$en", optional=True),
+        Text(".address", "address$en", optional=True),
+    ],
+}
+
+# The content types translated by the first versions of the translator
+FIRST_CONTENT_TYPES = [
+    "builtin_text",
+    "builtin_card",
+    "builtin_carousel",
+    "builtin_image",
+    "builtin_single-choice",
+    "dropdown",
+]
+
+# The files are read in this order, the member names can be glob patterns
+SCHEMA = {
+    **{
+        "content-elements/" + content_type + ".json": Source(
+            content_elements, fields, array=True, added=content_type not in FIRST_CONTENT_TYPES
+        )
+        for content_type, fields in CONTENT_TYPES.items()
+    },
+    # The say nodes of the flows have inline content elements
+    "flows/*.flow.json": Source(flow_nodes, [Content("content")], added=True),
+    "intents/*.json": Source(
+        intent, [Nested("utterances", [TextList(".utterance[{}]", "en", optional=True)])], added=True
+    ),
+    "qna/*.json": Source(
+        qna,
+        [
+            Nested("questions", [TextList(".question[{}]", "en", optional=True)], optional=True),
+            Nested("answers", [TextList(".answer[{}]", "en", optional=True)], optional=True),
+        ],
+        added=True,
+    ),
+}
+
+
+def compile_fields(fields):
+    """Compiles a list of fields to a function yielding (identifier suffix, container, key, added) for each text"""
+    visitors = [compile_field(field) for field in fields]
+
+    def visit(container, indices):
+        for visitor in visitors:
+            yield from visitor(container, indices)
+
+    return visit
+
+
+def compile_field(field):
+    if isinstance(field, Each):
+        key = field.key
+        visit_item = compile_fields(field.fields)
+
+        def visit(container, indices):
+            for index, item in enumerate(container[key]):
+                yield from visit_item(item, indices + (index,))
+
+        return visit
+
+    if isinstance(field, Nested):
+        key = field.key
+        optional = field.optional
+        visit_nested = compile_fields(field.fields)
+
+        def visit(container, indices):
+            if optional and key not in container:
+                return
+            yield from visit_nested(container[key], indices)
+
+        return visit
+
+    if isinstance(field, Content):
+        key = field.key
+
+        def visit(container, indices):
+            content = container.get(key)
+            # Contents of the types without texts are skipped
+            if content and content.get("contentType") in COMPILED_CONTENT_TYPES:
+                visit_content = COMPILED_CONTENT_TYPES[content["contentType"]]
+                yield from visit_content(content["formData"], indices)
+
+        return visit
+
+    identifier = field.identifier
+    key = field.key
+    optional = field.optional
+    added = field.added
+
+    if isinstance(field, TextList):
+
+        def visit(container, indices):
+            if optional and key not in container:
+                return
+            texts = container[key]
+            for index, text in enumerate(texts):
+                if text is not None:
+                    yield identifier.format(*indices, index), texts, index, added
+
+        return visit
+
+    def visit(container, indices):
+        if optional and key not in container:
+            return
+        # Texts without a value are not translated
+        if container[key] is not None:
+            yield identifier.format(*indices), container, key, added
+
+    return visit
+
+
+COMPILED_CONTENT_TYPES = {
+    content_type: compile_fields(fields) for content_type, fields in CONTENT_TYPES.items()
+}
+COMPILED_SCHEMA = {pattern: compile_fields(source.fields) for pattern, source in SCHEMA.items()}
+
+
+def find_pattern(name):
+    """Returns the pattern of the schema matching a member name, or None"""
+    if name in SCHEMA:
+        return name
+    for pattern in SCHEMA:
+        if fnmatch.fnmatchcase(name, pattern):
+            return pattern
+    return None
+
+
+def sort_members(names):
+    """Sorts member names in the order of the schema, and by name for the same pattern"""
+    order = {pattern: index for index, pattern in enumerate(SCHEMA)}
+    return sorted(names, key=lambda name: (order[find_pattern(name)], name))
+
+
+def load_document(name, content):
+    """Parses a file of the schema, the big arrays of elements are parsed one element at a time"""
+    if SCHEMA[find_pattern(name)].array:
+        return fastjson.iter_array(content)
+    return fastjson.loads(content)
+
+
+def iter_elements(name, document, with_added=False):
+    """Yields (element id, texts) for every element of a file of the schema.
+
+    texts is the list of the (identifier, container, key) of the texts of the element,
+    the text is container[key], so it can be read or replaced in place. With
+    with_added, the tuples end with whether the text is added, see above.
+    """
+    pattern = find_pattern(name)
+    visit = COMPILED_SCHEMA[pattern]
+    source_added = SCHEMA[pattern].added
+    for element_id, container in SCHEMA[pattern].elements(name, document):
+        texts = []
+        for suffix, texts_container, key, added in visit(container, ()):
+            if with_added:
+                texts.append((element_id + suffix, texts_container, key, added or source_added))
+            else:
+                texts.append((element_id + suffix, texts_container, key))
+        yield element_id, texts
+
+
+def walk(name, document, with_added=False):
+    """Yields (identifier, container, key) for every text of a file of the schema, see iter_elements"""
+    for _, texts in iter_elements(name, document, with_added):
+        yield from texts
@@ -0,0 +1,254 @@
+# Local HTTP service running extract and pack jobs
+#
+# The service keeps the translation backends, the translation memory and the
+# previous translation files in memory between the jobs, and runs the jobs
+# concurrently on a pool of workers. The files are uploaded to and
+# downloaded from a working directory:
+#
+#   PUT  /files/<name>     uploads a file (a bot archive or a translation file)
+#   GET  /files/<name>     downloads a file
+#   POST /jobs             starts a job, described by a JSON object, ?wait=true waits for its end
+#   GET  /jobs             lists the jobs
+#   GET  /jobs/<id>        returns the state of a job
+#
+# The fields of a job are the command line arguments, for example:
+#   {"mode": "extract", "bot": "bot.tgz", "excel": "bot_fr.xlsx", "target": "fr,de"}
+#   {"mode": "pack", "bot": "bot.tgz", "excel": "bot_fr.xlsx", "new": "bot_fr.tgz", "target": "fr"}
+
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from argparse import ArgumentTypeError
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from arguments import parse_bool, split_list
+from backends import get_backend
+from extract import DEFAULT_FUZZY_THRESHOLD, extract, load_previous_translations
+from pack import pack
+from translation_memory import TranslationMemory
+
+# Size of the chunks of the uploaded and downloaded files
+CHUNK_SIZE = 1024 * 1024
+
+
+class TranslatorService:
+    """Runs the jobs, and keeps what can be reused between the jobs"""
+
+    def __init__(self, directory, jobs=2, memory=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.lock = threading.Lock()
+        self.jobs = dict()
+        self.futures = dict()
+        self.backends = dict()
+        # The translations of the previous translation files, with their modification time
+        self.previous_translations = dict()
+        self.memory = TranslationMemory(memory) if memory else None
+
+    def path(self, name):
+        """Returns the path of a file of the working directory"""
+        if not name:
+            return name
+        if isinstance(name, list):
+            return [self.path(item) for item in name]
+        if os.path.basename(name) != name or name in (".", ".."):
+            raise ValueError("Invalid file name " + name)
+        return os.path.join(self.directory, name)
+
+    def backend(self, name):
+        # The backends keep their clients and models
+        with self.lock:
+            if name not in self.backends:
+                self.backends[name] = get_backend(name)
+            return self.backends[name]
+
+    def load_previous(self, previous, targets):
+        """Returns the translations of a previous translation file, loaded again only when it changed"""
+        if not previous:
+            return None
+        stat = os.stat(previous)
+        key = (previous, tuple(targets))
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            cached = self.previous_translations.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        translations = load_previous_translations(previous, targets)
+        with self.lock:
+            self.previous_translations[key] = (version, translations)
+        return translations
+
+    def submit(self, request):
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "request": request,
+            "error": None,
+            "submitted": time.time(),
+            "duration": None,
+        }
+        with self.lock:
+            self.jobs[job["id"]] = job
+            self.futures[job["id"]] = self.executor.submit(self.run, job)
+        return job
+
+    def wait(self, job_id):
+        self.futures[job_id].result()
+        return self.jobs[job_id]
+
+    def run(self, job):
+        job["status"] = "running"
+        start = time.perf_counter()
+        try:
+            run_job(self, job["request"])
+            job["status"] = "done"
+        except Exception as error:
+            traceback.print_exc()
+            job["status"] = "failed"
+            job["error"] = str(error)
+        job["duration"] = time.perf_counter() - start
+
+    def close(self):
+        self.executor.shutdown()
+        if self.memory:
+            self.memory.close()
+
+
+def run_job(service, request):
+    mode = request.get("mode")
+    targets = split_list(request.get("target", "fr"))
+    if mode == "extract":
+        previous = service.path(request.get("previous", ""))
+        use_translation = parse_bool(request.get("google", True))
+        extract(
+            service.path(request["bot"]),
+            excel_path=service.path(request["excel"]),
+            source=request.get("source", "en"),
+            targets=targets,
+            use_google_translate=use_translation,
+            previous=previous,
+            memory=service.memory,
+            max_workers=int(request.get("workers", 4)),
+            characters_per_second=float(request["rate"]) if request.get("rate") else None,
+            format=request.get("format", "auto"),
+            backend=service.backend(request.get("backend", "google") if use_translation else "copy"),
+            mask_placeholders=parse_bool(request.get("placeholders", True)),
+            previous_translations=service.load_previous(previous, targets),
+            fuzzy_threshold=float(request.get("fuzzy", DEFAULT_FUZZY_THRESHOLD)),
+            resume=parse_bool(request.get("resume", False)),
+        )
+    elif mode == "pack":
+        excel_paths = split_list(request["excel"])
+        pack(
+            service.path(request["bot"]),
+            service.path(excel_paths[0] if len(excel_paths) == 1 else excel_paths),
+            service.path(request["new"]),
+            targets,
+            format=request.get("format", "auto"),
+            compression_level=int(request.get("compression_level", 9)),
+            compression_threads=int(request.get("compression_threads", 1)),
+            dry_run=parse_bool(request.get("dry_run", False)),
+            json_style=request.get("json_style", "compat"),
+            multilingual=parse_bool(request.get("multilingual", False)),
+        )
+    else:
+        raise ValueError("Unknown mode " + str(mode))
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # The service is set by serve
+    service = None
+
+    def send_json(self, status, value):
+        body = json.dumps(value, indent=2, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self):
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+        return parts, parse_qs(url.query)
+
+    def do_PUT(self):
+        parts, _ = self.route()
+        if len(parts) != 2 or parts[0] != "files":
+            return self.send_json(404, {"error": "Not found"})
+        try:
+            path = self.service.path(parts[1])
+        except ValueError as error:
+            return self.send_json(400, {"error": str(error)})
+        remaining = int(self.headers.get("Content-Length", 0))
+        with open(path, "wb") as f:
+            while remaining > 0:
+                chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        self.send_json(201, {"file": parts[1]})
+
+    def do_GET(self):
+        parts, _ = self.route()
+        if parts == ["jobs"]:
+            return self.send_json(200, list(self.service.jobs.values()))
+        if len(parts) == 2 and parts[0] == "jobs":
+            if parts[1] not in self.service.jobs:
+                return self.send_json(404, {"error": "Unknown job " + parts[1]})
+            return self.send_json(200, self.service.jobs[parts[1]])
+        if len(parts) == 2 and parts[0] == "files":
+            try:
+                path = self.service.path(parts[1])
+            except ValueError as error:
+                return self.send_json(400, {"error": str(error)})
+            if not os.path.isfile(path):
+                return self.send_json(404, {"error": "Unknown file " + parts[1]})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, "rb") as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    self.wfile.write(chunk)
+            return
+        self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        parts, query = self.route()
+        if parts != ["jobs"]:
+            return self.send_json(404, {"error": "Not found"})
+        try:
+            wait = parse_bool(query.get("wait", ["false"])[0])
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not isinstance(request, dict) or request.get("mode") not in ("extract", "pack"):
+                raise ValueError("The mode of the job must be extract or pack")
+        except (ValueError, ArgumentTypeError) as error:
+            return self.send_json(400, {"error": str(error)})
+        job = self.service.submit(request)
+        if wait:
+            job = self.service.wait(job["id"])
+            return self.send_json(200 if job["status"] == "done" else 500, job)
+        self.send_json(202, job)
+
+
+def serve(host="127.0.0.1", port=8080, directory="translator_files", jobs=2, memory=None):
+    """Runs the translation service until it is interrupted"""
+    service = TranslatorService(directory, jobs, memory)
+    RequestHandler.service = service
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    print(f"Serving on http://{host}:{port}/ with the files of {os.path.abspath(directory)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
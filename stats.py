@@ -0,0 +1,38 @@
+from archive import iter_members
+from schema import SCHEMA, find_pattern, iter_elements, load_document
+
+
+def bot_stats(bot_path):
+    """Counts the texts of a bot without translating anything.
+
+    Returns a dictionary with the pattern of the files of the schema as key
+    and the number of files, elements, texts and characters as value, and
+    the set of the distinct texts of the bot.
+    """
+    stats = {pattern: dict(files=0, elements=0, texts=0, characters=0) for pattern in SCHEMA}
+    unique_texts = set()
+    for name, content in iter_members(bot_path, SCHEMA.keys()):
+        file_stats = stats[find_pattern(name)]
+        file_stats["files"] += 1
+        for _, texts in iter_elements(name, load_document(name, content)):
+            file_stats["elements"] += 1
+            for _, container, key in texts:
+                text = container[key]
+                file_stats["texts"] += 1
+                file_stats["characters"] += len(text)
+                unique_texts.add(text)
+    return stats, unique_texts
+
+
+def print_stats(bot_path):
+    stats, unique_texts = bot_stats(bot_path)
+    print("Texts of the bot " + bot_path)
+    print("%-45s %8s %9s %8s %11s" % ("Files", "Count", "Elements", "Texts", "Characters"))
+    for pattern, file_stats in stats.items():
+        if file_stats["files"]:
+            print("%-45s %8d %9d %8d %11d" % (pattern, *file_stats.values()))
+    texts = sum(file_stats["texts"] for file_stats in stats.values())
+    characters = sum(file_stats["characters"] for file_stats in stats.values())
+    print(f"{texts} texts and {characters} characters")
+    unique_characters = sum(len(text) for text in unique_texts)
+    print(f"{len(unique_texts)} distinct texts and {unique_characters} characters to translate")
@@ -0,0 +1,72 @@
+import gzip
+import io
+import os
+import random
+import tarfile
+
+import pytest
+
+from archive import BLOCK_SIZE, ParallelGzipWriter, read_members, write_archive
+
+
+def random_bytes(size, seed=0):
+    # Compressible but not trivially, like the media files of the bots
+    generator = random.Random(seed)
+    words = [bytes(generator.randrange(256) for _ in range(8)) for _ in range(64)]
+    return b"".join(generator.choice(words) for _ in range(size // 8 + 1))[:size]
+
+
+def make_bot(path, files):
+    with tarfile.open(path, "w:gz") as tar:
+        directory = tarfile.TarInfo("./content-elements")
+        directory.type = tarfile.DIRTYPE
+        tar.addfile(directory)
+        for name, content in files.items():
+            member = tarfile.TarInfo("./" + name)
+            member.size = len(content)
+            tar.addfile(member, io.BytesIO(content))
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_write_archive_round_trip(tmp_path, threads):
+    bot_path = str(tmp_path / "bot.tgz")
+    new_path = str(tmp_path / "new.tgz")
+    files = {
+        "content-elements/builtin_text.json": b"[]",
+        "media/video.mp4": random_bytes(5 * BLOCK_SIZE + 123),
+        "media/image.png": random_bytes(3 * BLOCK_SIZE, seed=1),
+    }
+    make_bot(bot_path, files)
+
+    replaced = b'[{"id": "text", "formData": {"text$en": "Bonjour"}}]'
+    write_archive(bot_path, new_path, {"content-elements/builtin_text.json": replaced}, 6, threads)
+
+    # A standard gzip file, readable by gzip and tarfile
+    with gzip.open(new_path) as f:
+        assert tarfile.open(fileobj=f, mode="r|").getnames()[0] == "./content-elements"
+    assert read_members(new_path, files.keys()) == {**files, "content-elements/builtin_text.json": replaced}
+    # No temporary file left
+    assert sorted(os.listdir(tmp_path)) == ["bot.tgz", "new.tgz"]
+
+
+@pytest.mark.parametrize("size", [0, 1, BLOCK_SIZE, 4 * BLOCK_SIZE, 4 * BLOCK_SIZE + 1])
+def test_parallel_gzip_writer(tmp_path, size):
+    # With a multiple of BLOCK_SIZE, the last block is empty
+    path = str(tmp_path / "data.gz")
+    data = random_bytes(size)
+    writer = ParallelGzipWriter(path, compression_level=6, threads=4)
+    # Writes of other sizes than the blocks
+    for start in range(0, size, 50000):
+        writer.write(data[start : start + 50000])
+    writer.close()
+    with gzip.open(path) as f:
+        assert f.read() == data
+
+
+def test_write_archive_onto_the_bot(tmp_path):
+    bot_path = str(tmp_path / "bot.tgz")
+    files = {"content-elements/builtin_text.json": b"[]", "media/video.mp4": random_bytes(2 * BLOCK_SIZE)}
+    make_bot(bot_path, files)
+    write_archive(bot_path, bot_path, {"content-elements/builtin_text.json": b"[1]"}, 6, 4)
+    assert read_members(bot_path, files.keys())["media/video.mp4"] == files["media/video.mp4"]
+    assert os.listdir(tmp_path) == ["bot.tgz"]
@@ -0,0 +1,54 @@
+from backends import MarianBackend, split_text
+
+
+def fits(text):
+    return len(text.split()) <= 4
+
+
+def test_split_text_at_sentences_then_words():
+    text = "One two three. Four five six seven eight.\n\nNine ten"
+    parts = split_text(text, fits)
+    assert parts == ["One two three.", " ", "Four five six seven", " ", "eight.", "\n\n", "Nine ten"]
+    assert "".join(parts) == text
+
+
+def test_split_text_keeps_placeholder_tokens():
+    parts = split_text('a b c d e f <x id="0"/> g', fits)
+    assert parts == ["a b c d", " ", 'e f <x id="0"/>', " ", "g"]
+
+
+class FakeTokens:
+    def __init__(self, text):
+        self.input_ids = text.split() + ["</s>"]
+
+
+class FakeTokenizer:
+    model_max_length = 5
+
+    def __call__(self, text):
+        return FakeTokens(text)
+
+
+class FakeMarian(MarianBackend):
+    def __init__(self):
+        super().__init__(batch_size=2)
+        self.batches = []
+
+    def get_model(self, source, target):
+        return FakeTokenizer(), None
+
+    def generate(self, tokenizer, model, texts):
+        # Like the model, the texts longer than the model would be truncated
+        assert all(len(tokenizer(text).input_ids) <= tokenizer.model_max_length for text in texts)
+        self.batches.append(texts)
+        return [text.upper() for text in texts]
+
+
+def test_marian_translates_long_texts_in_pieces():
+    backend = FakeMarian()
+    long_text = "one two three four five six. seven eight nine ten eleven"
+    assert backend.translate_batch(["short", long_text], "en", "fr") == [
+        "SHORT",
+        "ONE TWO THREE FOUR FIVE SIX. SEVEN EIGHT NINE TEN ELEVEN",
+    ]
+    assert all(len(batch) <= 2 for batch in backend.batches)
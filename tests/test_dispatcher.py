@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from backends import GoogleBackend
+from dispatcher import dispatch, split_chunks
+from translate import translate
+
+
+class QuotaError(Exception):
+    # Like the google.api_core exceptions, with the HTTP status code
+    code = 429
+
+
+class FakeClient:
+    """Local client with the translate method of the Google Translate client"""
+
+    def __init__(self, fail_from=None, error=Exception):
+        self.fail_from = fail_from
+        self.error = error
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def translate(self, texts, target_language, source_language):
+        with self.lock:
+            self.calls.append(list(texts))
+            call = len(self.calls)
+        if self.fail_from and call >= self.fail_from:
+            raise self.error("call %d failed" % call)
+        return [{"input": text, "translatedText": target_language + ":" + text} for text in texts]
+
+
+def test_translate_in_chunks():
+    client = FakeClient()
+    texts = ["text %d" % index for index in range(300)]
+    translations = translate(texts, "en", "fr", backend=GoogleBackend(client), max_workers=4)
+    assert translations == {text: "fr:" + text for text in texts}
+    # 128 texts per request at most
+    assert sorted(len(chunk) for chunk in client.calls) == [44, 128, 128]
+
+
+def test_split_chunks_limits():
+    chunks = split_chunks(["a" * 10] * 5 + ["b" * 100], max_texts=3, max_characters=25)
+    assert chunks == [["a" * 10] * 2, ["a" * 10] * 2, ["a" * 10], ["b" * 100]]
+
+
+def test_results_in_chunk_order():
+    chunks = [[str(index)] for index in range(20)]
+    results = dispatch(chunks, lambda chunk: [text + "!" for text in chunk], max_workers=8)
+    assert results == [[str(index) + "!"] for index in range(20)]
+
+
+def test_quota_errors_are_retried():
+    client = FakeClient(fail_from=1, error=QuotaError)
+    attempts = []
+
+    def send(chunk):
+        attempts.append(chunk)
+        if len(attempts) < 3:
+            raise QuotaError("quota exceeded")
+        return chunk
+
+    assert dispatch([["a"]], send, backoff=0) == [["a"]]
+    assert len(attempts) == 3
+    with pytest.raises(QuotaError):
+        dispatch([["a"]], lambda chunk: client.translate(chunk, "fr", "en"), retries=2, backoff=0)
+    assert len(client.calls) == 3
+
+
+def test_stop_at_first_error():
+    client = FakeClient(fail_from=4)
+    texts = ["text %d" % index for index in range(9 * 128)]
+    with pytest.raises(Exception, match="call 4 failed"):
+        translate(texts, "en", "fr", backend=GoogleBackend(client), max_workers=1)
+    # The chunks after the failed one are not sent
+    assert len(client.calls) == 4
@@ -0,0 +1,59 @@
+import pytest
+
+from placeholders import mask, unmask
+
+
+@pytest.mark.parametrize(
+    "text, template, values",
+    [
+        # The punctuation after a URL is not part of it
+        ("See https://example.com/a?b=1.", 'See <x id="0"/>.', ["https://example.com/a?b=1"]),
+        (
+            "Go to www.example.com, then (https://example.org/page).",
+            'Go to <x id="0"/>, then (<x id="1"/>).',
+            ["www.example.com", "https://example.org/page"],
+        ),
+        (
+            "Hi {{{event.payload.html}}} and {{user.name}}!",
+            'Hi <x id="0"/> and <x id="1"/>!',
+            ["{{{event.payload.html}}}", "{{user.name}}"],
+        ),
+        # The text of a markdown link is translated, not its URL
+        (
+            "Read [the docs](https://docs.example.com/start).",
+            'Read [the docs](<x id="0"/>).',
+            ["https://docs.example.com/start"],
+        ),
+        (
+            "Book a flight to [Paris](city) on [monday](date-time)",
+            'Book a flight to <x id="0"/> on <x id="1"/>',
+            ["[Paris](city)", "[monday](date-time)"],
+        ),
+        ("Run `npm install` now", 'Run <x id="0"/> now', ["`npm install`"]),
+        ("Nothing to mask", "Nothing to mask", []),
+    ],
+)
+def test_mask_round_trip(text, template, values):
+    assert mask(text) == (template, values)
+    assert unmask(template, values) == text
+
+
+def test_same_template_for_different_variables():
+    assert mask("Hello {{user.name}}")[0] == mask("Hello {{event.payload.name}}")[0]
+
+
+def test_unmask_reformatted_tokens():
+    values = ["{{a}}", "{{b}}"]
+    assert unmask("A < x id = '1' > B <x id=\"0\"></x>", values) == "A {{b}} B {{a}}"
+    assert unmask("A <x id=1/> B <x id='0' />", values) == "A {{b}} B {{a}}"
+
+
+def test_unmask_dropped_tokens():
+    # The placeholders dropped by the translation engine are added at the end
+    assert unmask("Bonjour", ["{{a}}", "{{b}}"]) == "Bonjour {{a}} {{b}}"
+    assert unmask('Bonjour <x id="1"/>', ["{{a}}", "{{b}}"]) == "Bonjour {{b}} {{a}}"
+
+
+def test_unmask_unknown_tokens_and_none():
+    assert unmask('<x id="5"/>', ["{{a}}"]) == '<x id="5"/> {{a}}'
+    assert unmask(None, ["{{a}}"]) is None
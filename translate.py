@@ -1,29 +1,100 @@
+from backends import get_backend
+from dispatcher import dispatch, split_chunks
 
-def translate(texts, source, target):
+
+def translate(
+    texts,
+    source,
+    target,
+    backend="google",
+    max_workers=4,
+    characters_per_second=None,
+    on_translated=None,
+):
     """Translates text into the target language.
 
     Target must be an ISO 639-1 language code.
     See https://g.co/cloud/translate/v2/translate-reference#supported_languages
+
+    backend is the name of a translation backend or a backend object, see backends.py.
+    The texts are sent in concurrent batches respecting the limits of the backend,
+    using at most max_workers requests at a time and characters_per_second
+    characters per second (defaults to the limit of the backend).
+    on_translated is called with a dictionary of the translations of every
+    batch as soon as it is translated, from the threads sending the batches.
     """
-    from html import unescape
-    from google.cloud import translate_v2 as translate
-    translate_client = translate.Client()
+    if on_translated:
+        callback = lambda _, translations: on_translated(translations)
+    else:
+        callback = None
+    return translate_targets(
+        {target: texts},
+        source,
+        backend=backend,
+        max_workers=max_workers,
+        characters_per_second=characters_per_second,
+        on_translated=callback,
+    )[target]
+
+
+def translate_targets(
+    texts_per_target,
+    source,
+    backend="google",
+    max_workers=4,
+    characters_per_second=None,
+    on_translated=None,
+):
+    """Translates texts into several target languages, see translate.
+
+    texts_per_target is a dictionary with the target language as key and the
+    list of the texts as value. The batches of all the target languages share
+    the max_workers requests and the characters_per_second rate limit.
+    on_translated is called with the target language and the dictionary of
+    the translations of every batch.
+    Returns a dictionary per target language with the text as key and its translation as value.
+    """
+    backend = get_backend(backend)
+
+    # Do batches respecting the limits of the backend, for each target language
+    chunks = []
+    for target, texts in texts_per_target.items():
+        # Remove duplicates and None from texts
+        texts = [text for text in dict.fromkeys(texts) if text is not None]
+        texts_chunks = split_chunks(
+            texts,
+            max_texts=backend.max_texts_per_request,
+            max_characters=backend.max_characters_per_request,
+            max_bytes=backend.max_bytes_per_request,
+        )
+        chunks.extend((target, texts_chunk) for texts_chunk in texts_chunks)
 
-    # Remove duplicates from texts
-    texts = list(set(texts))
+    # Nothing to translate, don't bother creating a client
+    if not chunks:
+        return {target: dict() for target in texts_per_target}
 
-    # Remove None from texts
-    texts = [text for text in texts if text is not None]
+    if backend.max_concurrency:
+        max_workers = min(max_workers, backend.max_concurrency)
+    if characters_per_second is None:
+        characters_per_second = backend.characters_per_second
 
-    # Do batch of maximum 128 texts at a time
-    texts_chunks = [texts[i:i+128] for i in range(0, len(texts), 128)]
-    results = []
+    def translate_chunk(chunk):
+        target, texts_chunk = chunk
+        translations = backend.translate_batch(texts_chunk, source, target)
+        if on_translated:
+            on_translated(target, dict(zip(texts_chunk, translations)))
+        return translations
 
-    for texts_chunk in texts_chunks:
-      # Translate each chunk of texts
-      translations = translate_client.translate(texts_chunk, target_language=target, source_language=source)
-      results.extend(translations)
+    chunks_results = dispatch(
+        chunks,
+        translate_chunk,
+        max_workers=max_workers,
+        characters_per_second=characters_per_second,
+        characters=lambda chunk: sum(len(text) for text in chunk[1]),
+    )
 
-    # Results is a list of dictionaries, with input and translatedText
-    # Return a dictionnary with input as key, and result as value
-    return {input: unescape(result['translatedText']) for input, result in zip(texts, results)}
\ No newline at end of file
+    # Return a dictionnary per target language with input as key, and the translation as value
+    translated = {target: dict() for target in texts_per_target}
+    for (target, texts_chunk), translations in zip(chunks, chunks_results):
+        translated[target].update(zip(texts_chunk, translations))
+    return translated
@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+
+# SQLite limits the number of variables in a single query
+QUERY_BATCH_SIZE = 500
+
+
+class TranslationMemory:
+    """Local on-disk cache of the translations done by the translation API.
+
+    Translations are stored in a SQLite database, keyed by source language,
+    target language and text. When the memory contains more than max_entries
+    translations, the least recently used ones are removed. The memory can
+    be shared between threads.
+    """
+
+    def __init__(self, path, max_entries=1000000):
+        self.max_entries = max_entries
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS translations (
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                text TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (source, target, text)
+            )"""
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)"
+        )
+        self.connection.commit()
+
+    def lookup(self, texts, source, target, touch=True):
+        """Returns a dictionary with the texts found in the memory as key and their translation as value.
+
+        With touch, the found translations are marked as recently used.
+        """
+        texts = list(set(texts))
+        found = dict()
+        with self.lock:
+            for i in range(0, len(texts), QUERY_BATCH_SIZE):
+                batch = texts[i : i + QUERY_BATCH_SIZE]
+                rows = self.connection.execute(
+                    "SELECT text, translation FROM translations"
+                    " WHERE source = ? AND target = ? AND text IN (%s)"
+                    % ",".join("?" * len(batch)),
+                    [source, target, *batch],
+                )
+                found.update(rows)
+
+            # Mark the found translations as recently used, so they are not evicted
+            if touch:
+                now = time.time()
+                self.connection.executemany(
+                    "UPDATE translations SET last_used = ? WHERE source = ? AND target = ? AND text = ?",
+                    [(now, source, target, text) for text in found],
+                )
+                self.connection.commit()
+        metrics.count("cache hits", len(found))
+        metrics.count("cache misses", len(texts) - len(found))
+        return found
+
+    def update(self, translations, source, target):
+        """Adds a dictionary of translations (text as key, translation as value) to the memory"""
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                [
+                    (source, target, text, translation, now)
+                    for text, translation in translations.items()
+                    if translation is not None
+                ],
+            )
+            self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM translations").fetchone()
+        if count > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM translations WHERE rowid IN"
+                " (SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                [count - self.max_entries],
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,135 @@
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.comments import Comment
+from openpyxl.utils import get_column_letter
+
+from formats import translation_header
+
+
+def write_translations_to_excel(excel_path, records, targets):
+    """Writes the records (see formats.Record) to an excel translation file.
+
+    The new translations of the records are highlighted, and the translations
+    of similar texts to review are highlighted and commented. The workbook is
+    written in write-only mode: every row is styled and written to the file
+    as it is appended, so the memory usage doesn't grow with the number of rows.
+    """
+    print("Writing Excel file...")
+    # Create a new excel file
+    wb = openpyxl.Workbook(write_only=True)
+    # Create a new sheet
+    ws = wb.create_sheet("Translations")
+
+    idStyle = openpyxl.styles.NamedStyle(name="id")
+    idStyle.font = openpyxl.styles.Font(
+        bold=True,
+        name="Courier New",
+        size=9,
+    )
+    idStyle.fill = openpyxl.styles.PatternFill(
+        fgColor="EEEEEE",
+        fill_type="solid",
+    )
+    idStyle.alignment = openpyxl.styles.Alignment(
+        wrap_text=True,
+    )
+    headerStyle = openpyxl.styles.NamedStyle(name="header")
+    headerStyle.font = openpyxl.styles.Font(
+        bold=True,
+        size=10,
+        name="Calibri",
+    )
+    headerStyle.fill = openpyxl.styles.PatternFill(
+        fgColor="CCCCCC",
+        fill_type="solid",
+    )
+    originalStyle = openpyxl.styles.NamedStyle(name="original")
+    originalStyle.font = openpyxl.styles.Font(
+        name="Calibri",
+        # Dark brown colour
+        color="663300",
+        italic=True,
+    )
+    originalStyle.alignment = openpyxl.styles.Alignment(
+        vertical="top",
+        wrap_text=True,
+    )
+    translationStyle = openpyxl.styles.NamedStyle(name="translation")
+    translationStyle.font = openpyxl.styles.Font(
+        name="Calibri",
+    )
+    translationStyle.alignment = openpyxl.styles.Alignment(
+        vertical="top",
+        wrap_text=True,
+    )
+    newTranslationStyle = openpyxl.styles.NamedStyle(name="newTranslation")
+    newTranslationStyle.font = openpyxl.styles.Font(
+        name="Calibri",
+    )
+    newTranslationStyle.alignment = openpyxl.styles.Alignment(
+        vertical="top",
+        wrap_text=True,
+    )
+    newTranslationStyle.fill = openpyxl.styles.PatternFill(
+        # Light orange
+        fgColor="FFCC99",
+        fill_type="solid",
+    )
+    reviewTranslationStyle = openpyxl.styles.NamedStyle(name="reviewTranslation")
+    reviewTranslationStyle.font = openpyxl.styles.Font(
+        name="Calibri",
+    )
+    reviewTranslationStyle.alignment = openpyxl.styles.Alignment(
+        vertical="top",
+        wrap_text=True,
+    )
+    reviewTranslationStyle.fill = openpyxl.styles.PatternFill(
+        # Light yellow
+        fgColor="FFFF99",
+        fill_type="solid",
+    )
+    for style in [idStyle, headerStyle, originalStyle, translationStyle, newTranslationStyle, reviewTranslationStyle]:
+        wb.add_named_style(style)
+
+    # The column widths must be set before writing the rows
+    ws.column_dimensions["A"].width = 20
+    ws.column_dimensions["B"].width = 30
+    for column in range(3, 3 + len(targets)):
+        ws.column_dimensions[get_column_letter(column)].width = 30
+
+    # Lock the cells that shouldn't be edited
+    ws.protection.sheet = True
+
+    def styled_cell(value, style):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    # Write the headers, with one translation column per target language
+    if len(targets) == 1:
+        headers = ["Identifier", "Original English Text", translation_header()]
+    else:
+        headers = ["Identifier", "Original English Text", *[translation_header(target) for target in targets]]
+    ws.append([styled_cell(header, "header") for header in headers])
+
+    # Unlock the translation rows
+    unlocked = openpyxl.styles.protection.Protection(locked=False)
+
+    # Write the records to the sheet
+    for record in records:
+        row = [styled_cell(record.identifier, "id"), styled_cell(record.original, "original")]
+        for target in targets:
+            cell = styled_cell(record.translations[target], "translation")
+            if target in record.new:
+                cell.style = "newTranslation"
+            # The translations of similar texts must be reviewed
+            if target in record.review:
+                similar, similarity = record.review[target]
+                cell.style = "reviewTranslation"
+                cell.comment = Comment(f"Translation of a similar text ({similarity:.0%}):\n{similar}", "Fuzzy match")
+            cell.protection = unlocked
+            row.append(cell)
+        ws.append(row)
+
+    wb.save(excel_path)
+    print("Excel file created: " + excel_path)